@@ -0,0 +1,173 @@
+#  -*- encoding:UTF-8 -*-
+#
+# A stand-in for the NS2 dedicated server, used by run_benchmark.py.
+#
+# It accepts the launch parameters the watchdog passes to the real server, behaves like a server with the helper
+# mod installed (it keeps rewriting server_modding_ping.txt) and can be told to misbehave through the extra
+# "-bench_*" parameters. Every notable moment is appended as a JSON line to the file given by -bench_events, so the
+# harness can measure how the watchdog reacted.
+#
+# Works with both Python 2.7 and Python 3.
+
+import ctypes
+import ctypes.util
+import json
+import os
+import signal
+import sys
+import time
+
+PING_FILE_NAME = "server_modding_ping.txt"
+PING_RECORD_FORMAT = "%m/%d/%y %H:%M:%S"
+POSIX_FADV_DONTNEED = 4
+
+DEFAULT_OPTIONS = {
+    'config_path': None,
+    'modstorage': None,
+    'logdir': None,
+    'bench_events': None,
+    'bench_ping_interval': 1.0,  # how often the "helper mod" updates its record
+    'bench_startup_delay': 0.0,  # seconds before the first record, like loading the map
+    'bench_startup_read_mods': 0,  # read every file of the mod storage before the first record
+    'bench_evict_mods': 0,  # drop the mod storage from the OS file cache when crashing or freezing
+    'bench_shutdown_delay': 0.0,  # seconds between SIGTERM and the exit, like saving the game state
+    'bench_crash_after': 0.0,  # exit with an error after this many seconds
+    'bench_freeze_after': 0.0,  # stop updating the record (but keep running) after this many seconds
+    'bench_leak_rate': 0,  # bytes of memory leaked per second
+    'bench_dump_size': 0,  # bytes of fake crash dump / log written into the log dir at startup
+}
+
+
+def parse_options(argv):
+    options = dict(DEFAULT_OPTIONS)
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg.startswith('-') and i + 1 < len(argv):
+            name = arg[1:]
+            if name in options:
+                default = DEFAULT_OPTIONS[name]
+                value = argv[i + 1]
+                if isinstance(default, float):
+                    value = float(value)
+                elif isinstance(default, int):
+                    value = int(value)
+                options[name] = value
+                i = i + 2
+                continue
+        # other NS2 parameters (-name, -map, -port ...) are accepted and ignored
+        i = i + 1
+    return options
+
+
+def evict_from_page_cache(root):
+    # Drop the files from the OS file cache (Linux only), so they get read from the disk again like after a long
+    # uptime. The dirty pages can't be dropped, they are written back first.
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    libc.posix_fadvise.argtypes = [ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_int]
+    for dir_path, dirs, files in os.walk(root):
+        for fn in files:
+            fd = os.open(os.path.join(dir_path, fn), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+                libc.posix_fadvise(fd, 0, 0, POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+class FakeServer(object):
+    def __init__(self, options):
+        self.options = options
+        self.start_time = time.time()
+        self.leaked = []
+        self.events_path = options['bench_events']
+
+    def record_event(self, event, **kwargs):
+        kwargs.setdefault('time', time.time())
+        kwargs.update({'event': event, 'pid': os.getpid()})
+        if self.events_path:
+            with open(self.events_path, 'a') as f:
+                f.write(json.dumps(kwargs) + "\n")
+
+    def write_ping(self):
+        path = os.path.join(self.options['config_path'], PING_FILE_NAME)
+        with open(path, 'w') as f:
+            f.write(time.strftime(PING_RECORD_FORMAT, time.localtime(time.time())))
+
+    def write_dump(self):
+        # Half incompressible, half highly compressible, roughly like a crash dump next to a text log.
+        size = self.options['bench_dump_size']
+        random_part = size // 2
+        with open(os.path.join(self.options['logdir'], "fake_crash.dmp"), 'wb') as f:
+            while random_part > 0:
+                n = min(random_part, 1024 * 1024)
+                f.write(os.urandom(n))
+                random_part = random_part - n
+        text_part = size - size // 2
+        line = b"Server: tick rate 30.0, entities 1200, players 12, nothing interesting happened\n"
+        with open(os.path.join(self.options['logdir'], "log-Server.txt"), 'ab') as f:
+            chunk = line * (1024 * 1024 // len(line))
+            while text_part > 0:
+                n = min(text_part, len(chunk))
+                f.write(chunk[:n])
+                text_part = text_part - n
+
+    def read_mods(self):
+        total = 0
+        for root, dirs, files in os.walk(self.options['modstorage']):
+            for fn in files:
+                with open(os.path.join(root, fn), 'rb') as f:
+                    while True:
+                        data = f.read(1024 * 1024)
+                        if not data:
+                            break
+                        total = total + len(data)
+        return total
+
+    def run(self):
+        def on_sigterm(sig, frame):
+            self.record_event('terminated')
+            if self.options['bench_shutdown_delay'] > 0:
+                time.sleep(self.options['bench_shutdown_delay'])
+            sys.exit(0)
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+        self.record_event('start')
+        if self.options['bench_dump_size'] > 0:
+            self.write_dump()
+        if self.options['bench_startup_read_mods']:
+            read_start = time.time()
+            size = self.read_mods()
+            self.record_event('mods_read', bytes=size, seconds=time.time() - read_start)
+        if self.options['bench_startup_delay'] > 0:
+            time.sleep(self.options['bench_startup_delay'])
+
+        self.record_event('ready')
+        is_frozen = False
+        last_ping_time = None
+        last_leak_time = time.time()
+        while True:
+            elapsed = time.time() - self.start_time
+            if 0 < self.options['bench_crash_after'] <= elapsed:
+                self.record_event('crash')
+                if self.options['bench_evict_mods']:
+                    evict_from_page_cache(self.options['modstorage'])
+                os._exit(3)
+            if 0 < self.options['bench_freeze_after'] <= elapsed and not is_frozen:
+                is_frozen = True
+                if self.options['bench_evict_mods']:
+                    evict_from_page_cache(self.options['modstorage'])
+                # the lua engine is considered frozen since its last record
+                self.record_event('freeze', time=last_ping_time or time.time())
+            if not is_frozen:
+                self.write_ping()
+                last_ping_time = time.time()
+            if self.options['bench_leak_rate'] > 0:
+                now = time.time()
+                self.leaked.append(b"\x01" * int(self.options['bench_leak_rate'] * (now - last_leak_time)))
+                last_leak_time = now
+            time.sleep(self.options['bench_ping_interval'])
+
+
+if __name__ == '__main__':
+    FakeServer(parse_options(sys.argv[1:])).run()
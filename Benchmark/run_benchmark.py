@@ -0,0 +1,455 @@
+#!/usr/bin/env python2.7
+#  -*- encoding:UTF-8 -*-
+#
+# Benchmark of the NS2 Server Watchdog, using fake_ns2_server.py in place of the real NS2 server (Linux only).
+#
+# Most scenarios run the real ServerWatchDog / ServerProcessHandler / ASyncZipper in a fresh worker process and a
+# scratch working dir, with the fake server crashing, freezing, leaking memory or dumping files on schedule. The
+# reaction of the watchdog is measured from the events recorded by the fake server, and the results are saved as
+# JSON so two runs can be compared. The 'startup' scenario runs NS2_Server_WDT.py itself, the way an admin does,
+# and measures how long it takes to spawn the server:
+#
+#   python2.7 Benchmark/run_benchmark.py
+#   python2.7 Benchmark/run_benchmark.py --scenario crash --scenario freeze --compare Benchmark/results/<old>.json
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import signal
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Thread
+
+from fake_ns2_server import evict_from_page_cache
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+FAKE_SERVER_PATH = os.path.join(BENCHMARK_DIR, "fake_ns2_server.py")
+DEFAULT_RESULT_DIR = os.path.join(BENCHMARK_DIR, "results")
+RESULT_DATE_PATTERN = '%Y-%m-%d_%H-%M-%S'
+
+# Watchdog config shared by all the scenarios, paths are relative to the scenario's working dir.
+BASE_CONFIG = {
+    'monitor_interval': 1,
+    'config_hot_reload': False,
+    'lua_engine_check_status': True,
+    'lua_engine_no_response_threshold': 10,
+    'daily_restart': False,
+    'crash_loop_protection': False,
+    'server_config_executable_path': u"./ns2server",
+    'server_config_executable_name': u"server_linux",
+    'server_config_dir_cfg': u"./server_data/ns2server_configs",
+    'server_config_dir_mod': u"./server_data/ns2server_mods",
+    'server_config_dir_log': u"./server_data/ns2server_logs_running",
+    'server_config_dir_log_archive': u"./server_data/ns2server_logs_archive",
+    'metrics_http_enable': False,
+    'verbose_level': 1,
+}
+
+SCENARIOS = {
+    # The server crashes 3s after every launch: crash-to-restart latency and restart downtime.
+    'crash': {
+        'duration': 20,
+        'server': {'bench_crash_after': 3},
+        'config': {},
+    },
+    # The lua engine freezes 3s after every launch: freeze detection latency.
+    'freeze': {
+        'duration': 30,
+        'server': {'bench_freeze_after': 3},
+        'config': {'lua_engine_no_response_threshold': 5},
+    },
+    # The server leaks memory and the daily restart fires 8s after the start: planned restart downtime.
+    'planned_restart': {
+        'duration': 16,
+        'daily_restart_after': 8,
+        'server': {'bench_leak_rate': 16 * 1024 * 1024},
+        'config': {'daily_restart': True, 'daily_restart_vms_threshold': 0},
+    },
+    # The server crashes right after every launch: the crash loop guard's backoff, breaker and archive coalescing.
+    'crash_loop': {
+        'duration': 30,
+        'server': {'bench_crash_after': 0.5},
+        'config': {'crash_loop_protection': True, 'crash_loop_backoff_base': 2, 'crash_loop_breaker_threshold': 5,
+                   'crash_loop_breaker_cooldown': 0},
+    },
+    # The server dumps 64MB into the log dir and crashes: archive throughput.
+    'archive': {
+        'duration': 20,
+        'server': {'bench_crash_after': 5, 'bench_dump_size': 64 * 1024 * 1024},
+        'config': {},
+    },
+    # The server reads 256MB of mods at every launch, drops them from the OS file cache when its lua engine freezes and
+    # takes 2s to shut down: time from the spawn to the first heartbeat when loading the mods from the disk...
+    'mod_load': {
+        'duration': 40,
+        'mods': {'ids': ['44ae3979', '5f4b2c10'], 'files': 32, 'file_size': 4 * 1024 * 1024},
+        'server': {'bench_freeze_after': 2, 'bench_startup_read_mods': 1, 'bench_evict_mods': 1,
+                   'bench_shutdown_delay': 2},
+        'config': {'lua_engine_no_response_threshold': 3},
+    },
+    # ... and once the watchdog pre-warmed them.
+    'mod_load_prewarm': {
+        'duration': 40,
+        'mods': {'ids': ['44ae3979', '5f4b2c10'], 'files': 32, 'file_size': 4 * 1024 * 1024},
+        'server': {'bench_freeze_after': 2, 'bench_startup_read_mods': 1, 'bench_evict_mods': 1,
+                   'bench_shutdown_delay': 2},
+        'config': {'lua_engine_no_response_threshold': 3, 'prewarm_page_cache': True},
+    },
+    # NS2_Server_WDT.py is started from scratch several times: time from the watchdog's start to the server's spawn.
+    'startup': {
+        'runs': 10,
+        'server': {},
+        'config': {},
+    },
+    # Nothing goes wrong: the watchdog's own CPU and memory overhead.
+    'idle': {
+        'duration': 30,
+        'server': {},
+        'config': {},
+    },
+}
+
+
+def summarize(values):
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'min': values[0],
+        'median': values[len(values) // 2],
+        'max': values[-1],
+    }
+
+
+def find_next(events, after, name, pid=None):
+    for e in events:
+        if e['time'] >= after['time'] and e['event'] == name and (pid is None or e['pid'] == pid):
+            return e
+    return None
+
+
+def analyze_events(events, config):
+    events = sorted(events, key=lambda e: e['time'])
+    crash_to_restart = []
+    freeze_detection = []
+    downtime = []
+    restart_to_ready = []
+    startup = []
+    for e in events:
+        if e['event'] == 'crash':
+            nxt = find_next(events, e, 'start')
+            if nxt is not None:
+                crash_to_restart.append(nxt['time'] - e['time'])
+        elif e['event'] == 'freeze':
+            nxt = find_next(events, e, 'terminated', e['pid'])
+            if nxt is not None:
+                freeze_detection.append(nxt['time'] - e['time'])
+        elif e['event'] == 'terminated':
+            nxt = find_next(events, e, 'start')
+            if nxt is not None and nxt['pid'] != e['pid']:
+                downtime.append(nxt['time'] - e['time'])
+                nxt = find_next(events, nxt, 'ready', nxt['pid'])
+                if nxt is not None:
+                    restart_to_ready.append(nxt['time'] - e['time'])
+        elif e['event'] == 'start':
+            nxt = find_next(events, e, 'ready', e['pid'])
+            if nxt is not None:
+                startup.append(nxt['time'] - e['time'])
+
+    result = {
+        'server_launches': len([e for e in events if e['event'] == 'start']),
+        'crash_to_restart_s': summarize(crash_to_restart),
+        'freeze_detection_s': summarize(freeze_detection),
+        'restart_downtime_s': summarize(downtime),
+        'restart_to_ready_s': summarize(restart_to_ready),
+        'server_startup_s': summarize(startup),
+        'mods_read_s': summarize([e['seconds'] for e in events if e['event'] == 'mods_read']),
+    }
+    if freeze_detection:
+        # how long the watchdog took beyond the configured tolerance
+        result['freeze_detection_overhead_s'] = summarize(
+            [i - config['lua_engine_no_response_threshold'] for i in freeze_detection])
+    return result
+
+
+def prepare_workdir(workdir, scenario):
+    for key in ('server_config_dir_cfg', 'server_config_dir_mod', 'server_config_dir_log',
+                'server_config_dir_log_archive'):
+        os.makedirs(os.path.join(workdir, BASE_CONFIG[key]))
+
+    server_params = u" ".join(u"-%s %s" % (k, v) for k, v in sorted(scenario['server'].items()))
+    if 'mods' in scenario:
+        # laid out like the mod storage, m<id>_<version>/..., and evicted from the OS file cache like after a reboot
+        mods = scenario['mods']
+        mod_dir = os.path.join(workdir, BASE_CONFIG['server_config_dir_mod'])
+        for mod_id in mods['ids']:
+            os.makedirs(os.path.join(mod_dir, "m%s_1" % mod_id))
+            for i in range(mods['files']):
+                with open(os.path.join(mod_dir, "m%s_1" % mod_id, "file%03d.bin" % i), 'wb') as f:
+                    f.write(os.urandom(mods['file_size']))
+        evict_from_page_cache(mod_dir)
+        server_params = server_params + u" -mods '%s'" % u" ".join(mods['ids'])
+    config = dict(BASE_CONFIG)
+    config.update(scenario['config'])
+    config['server_config_extra_parameter'] = u"-name 'Benchmark' -map 'ns2_veil' -bench_events '%s' %s" % (
+        os.path.join(workdir, "events.jsonl"), server_params)
+    if 'daily_restart_after' in scenario:
+        t = time.localtime(time.time() + scenario['daily_restart_after'])
+        config['daily_restart_h_m_s'] = [t.tm_hour, t.tm_min, t.tm_sec]
+    with open(os.path.join(workdir, "config.json"), 'w') as f:
+        json.dump(config, f, indent=4, sort_keys=True)
+
+    # The watchdog launches <root>/x64/<name>, which execs the fake server (same pid).
+    executable_dir = os.path.join(workdir, BASE_CONFIG['server_config_executable_path'], "x64")
+    os.makedirs(executable_dir)
+    executable_path = os.path.join(executable_dir, BASE_CONFIG['server_config_executable_name'])
+    with open(executable_path, 'w') as f:
+        f.write("#!/bin/sh\nexec '%s' '%s' \"$@\"\n" % (sys.executable, FAKE_SERVER_PATH))
+    os.chmod(executable_path, os.stat(executable_path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return config
+
+
+def run_scenario(name, scenario, keep_workdir):
+    workdir = tempfile.mkdtemp(prefix="ns2wdt-bench-%s-" % name)
+    try:
+        config = prepare_workdir(workdir, scenario)
+        env = dict(os.environ)
+        if not env.get('LANG') and not env.get('LC_ALL'):
+            # the console writer needs a locale to encode the log lines
+            env['LANG'] = 'C.UTF-8'
+        with open(os.path.join(workdir, "console.txt"), 'w') as console:
+            ret = subprocess.call([sys.executable, os.path.abspath(__file__), '--worker', workdir,
+                                   str(scenario['duration'])], stdout=console, stderr=subprocess.STDOUT, env=env)
+        if ret != 0:
+            raise RuntimeError("Worker of scenario '%s' failed (exit code %d), see %s/console.txt" % (
+                name, ret, workdir))
+
+        with open(os.path.join(workdir, "worker_result.json")) as f:
+            worker_result = json.load(f)
+        events = read_events(os.path.join(workdir, "events.jsonl"))
+        result = analyze_events(events, config)
+        result.update(worker_result)
+        return result
+    finally:
+        if keep_workdir:
+            print("Working dir of scenario '%s' kept at %s" % (name, workdir))
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def read_events(events_path):
+    if not os.path.exists(events_path):
+        return []
+    with open(events_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def wait_for_event(events_path, name, after_time, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        for e in read_events(events_path):
+            if e['event'] == name and e['time'] >= after_time:
+                return e
+        time.sleep(0.005)
+    return None
+
+
+def run_startup_scenario(name, scenario, keep_workdir):
+    # The time from starting the watchdog to the server's 'start' event includes the fake server's own interpreter
+    # startup, which is measured by spawning the fake server directly and subtracted.
+    workdir = tempfile.mkdtemp(prefix="ns2wdt-bench-%s-" % name)
+    try:
+        prepare_workdir(workdir, scenario)
+        env = dict(os.environ)
+        if not env.get('LANG') and not env.get('LC_ALL'):
+            env['LANG'] = 'C.UTF-8'
+        events_path = os.path.join(workdir, "events.jsonl")
+        executable_path = os.path.join(workdir, BASE_CONFIG['server_config_executable_path'], "x64",
+                                       BASE_CONFIG['server_config_executable_name'])
+        cfg_dir = os.path.join(workdir, BASE_CONFIG['server_config_dir_cfg'])
+        server_alone = []
+        watchdog_to_server = []
+        for i in range(scenario['runs']):
+            start_time = time.time()
+            subprocess.call([executable_path, '-config_path', cfg_dir, '-bench_events', events_path,
+                             '-bench_crash_after', '0.001'])
+            e = wait_for_event(events_path, 'start', start_time, 10)
+            if e is not None:
+                server_alone.append(e['time'] - start_time)
+
+            with open(os.path.join(workdir, "console.txt"), 'a') as console:
+                start_time = time.time()
+                watchdog = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, "NS2_Server_WDT.py")],
+                                            cwd=workdir, stdout=console, stderr=subprocess.STDOUT, env=env)
+                e = wait_for_event(events_path, 'start', start_time, 30)
+                if e is not None:
+                    watchdog_to_server.append(e['time'] - start_time)
+                watchdog.send_signal(signal.SIGINT)
+                if watchdog.wait() != 0 or e is None:
+                    raise RuntimeError("The watchdog of scenario '%s' failed, see %s/console.txt" % (name, workdir))
+
+        server_alone_median = summarize(server_alone)['median']
+        return {
+            'startup_runs': len(watchdog_to_server),
+            'watchdog_to_server_start_s': summarize(watchdog_to_server),
+            'server_interpreter_startup_s': summarize(server_alone),
+            'watchdog_startup_s': summarize([t - server_alone_median for t in watchdog_to_server]),
+        }
+    finally:
+        if keep_workdir:
+            print("Working dir of scenario '%s' kept at %s" % (name, workdir))
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_worker(workdir, duration):
+    # Runs inside the worker process: drive the real watchdog for the given duration.
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+    import psutil
+    import NS2_Server_WDT as wdt
+
+    def stop_later():
+        time.sleep(duration)
+        wdt.ExitFlag = True
+
+    wdt.Logger.init_logger()
+    watchdog = wdt.ServerWatchDog()
+    stopper = Thread(target=stop_later)
+    stopper.daemon = True
+    stopper.start()
+
+    start_time = time.time()
+    watchdog.run_server()
+    wall_time = time.time() - start_time
+
+    proc = psutil.Process()
+    cpu_times = proc.cpu_times()
+    archive_bytes = wdt.WatchdogMetrics.archive_bytes.get()
+    archive_seconds = wdt.WatchdogMetrics.archive_seconds.get()
+    result = {
+        'watchdog_wall_s': wall_time,
+        'watchdog_cpu_s': cpu_times.user + cpu_times.system,
+        'watchdog_cpu_percent': 100.0 * (cpu_times.user + cpu_times.system) / wall_time,
+        'watchdog_rss_mb': proc.memory_info().rss / 1024.0 / 1024.0,
+        'archive_jobs': wdt.WatchdogMetrics.archive_jobs.get(),
+        'archive_mb': archive_bytes / 1024.0 / 1024.0,
+        'archive_mbps': (archive_bytes / 1024.0 / 1024.0 / archive_seconds) if archive_seconds > 0 else None,
+        'restarts': dict((k[0], v) for k, v in wdt.WatchdogMetrics.restarts.get_all().items()),
+        'crash_loop_breaker_trips': wdt.WatchdogMetrics.crash_loop_breaker_trips.get(),
+    }
+    with open(os.path.join(workdir, "worker_result.json"), 'w') as f:
+        json.dump(result, f, indent=4, sort_keys=True)
+
+
+def flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            flatten(prefix + "." + k if prefix else k, v, out)
+    elif isinstance(value, (int, long, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def compare(old_results, new_results, tolerance):
+    # Higher is better for throughput, lower is better for everything else.
+    old_values = flatten("", old_results['scenarios'], {})
+    new_values = flatten("", new_results['scenarios'], {})
+    regressions = 0
+    print("\n%-60s %14s %14s %9s" % ("metric", "old", "new", "change"))
+    for key in sorted(set(old_values) & set(new_values)):
+        old, new = old_values[key], new_values[key]
+        if key.endswith(('.count', '.server_launches', '.archive_jobs', '.archive_mb', '.crash_loop_breaker_trips',
+                         '.startup_runs')) \
+                or '.restarts.' in key:
+            change_str, marker = "", ""
+        elif old == 0:
+            change_str, marker = "n/a", ""
+        else:
+            change = (new - old) / abs(old)
+            is_worse = change < -tolerance if key.endswith('_mbps') else change > tolerance
+            change_str = "%+.1f%%" % (change * 100)
+            marker = "  <-- regression" if is_worse else ""
+            regressions = regressions + (1 if is_worse else 0)
+        print("%-60s %14.4f %14.4f %9s%s" % (key, old, new, change_str, marker))
+    return regressions
+
+
+def print_results(results):
+    for name, result in sorted(results['scenarios'].items()):
+        print("\n[%s]" % name)
+        for key, value in sorted(flatten("", result, {}).items()):
+            print("  %-48s %.4f" % (key, value))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT,
+                                       stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the NS2 Server Watchdog against a fake NS2 server.")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS.keys()),
+                        help="scenario to run, can be repeated (default: all)")
+    parser.add_argument('--output', default=DEFAULT_RESULT_DIR, help="directory to save the results in")
+    parser.add_argument('--compare', metavar='RESULT_JSON', help="compare the results with a previous run")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="relative change reported as a regression when comparing (default: 0.1)")
+    parser.add_argument('--keep-workdir', action='store_true', help="don't delete the scenarios' working dirs")
+    parser.add_argument('--worker', nargs=2, metavar=('WORKDIR', 'DURATION'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args.worker[0], float(args.worker[1]))
+        return 0
+
+    if platform.system() != 'Linux':
+        print("The benchmark relies on a shell script as the server executable and only runs on Linux.")
+        return 1
+
+    results = {
+        'time': time.strftime(RESULT_DATE_PATTERN, time.localtime(time.time())),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'host': platform.node(),
+        'cpu_count': os.sysconf('SC_NPROCESSORS_ONLN'),
+        'scenarios': {},
+    }
+    for name in args.scenario or sorted(SCENARIOS.keys()):
+        scenario = SCENARIOS[name]
+        if 'runs' in scenario:
+            print("Running scenario '%s' (%d runs)..." % (name, scenario['runs']))
+            results['scenarios'][name] = run_startup_scenario(name, scenario, args.keep_workdir)
+        else:
+            print("Running scenario '%s' (%ds)..." % (name, scenario['duration']))
+            results['scenarios'][name] = run_scenario(name, scenario, args.keep_workdir)
+
+    print_results(results)
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    result_path = os.path.join(args.output, "%s.json" % results['time'])
+    with open(result_path, 'w') as f:
+        json.dump(results, f, indent=4, sort_keys=True)
+    print("\nResults saved to %s" % result_path)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        print("\n%d regression(s) beyond %.0f%%" % (regressions, args.tolerance * 100))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
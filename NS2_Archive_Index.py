@@ -0,0 +1,174 @@
+#!/usr/bin/env python2.7
+#  -*- encoding:UTF-8 -*-
+#
+# Query the index of the archived server runs, which the watchdog writes while compressing each run into
+# <server_config_dir_log_archive>/<time>.zip. No zip gets opened, except by "rebuild".
+#
+#   python2.7 NS2_Archive_Index.py                                    summary of the archive
+#   python2.7 NS2_Archive_Index.py runs --crash-dump --limit 1         when did the crash dumps start appearing
+#   python2.7 NS2_Archive_Index.py runs --reason lua_engine_dead --since 2017-09-01
+#   python2.7 NS2_Archive_Index.py files 2017-09-02_04-00-00
+#   python2.7 NS2_Archive_Index.py search '"script error" AND GUIScoreboard'   (needs archive_index_full_text)
+#   python2.7 NS2_Archive_Index.py rebuild --full-text                 (re)index the existing archives
+
+import argparse
+import datetime
+import glob
+import os
+import sys
+import time
+
+from NS2_Server_WDT import ConfigManager, Logger
+from Utils.ArchiveIndex import ArchiveIndex
+
+MB = 1024 * 1024
+
+
+def format_time(timestamp):
+    if timestamp is None:
+        return u"-"
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+def parse_time(st):
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return time.mktime(datetime.datetime.strptime(st, fmt).timetuple())
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError("unknown time format '%s', expecting 'YYYY-MM-DD HH:MM:SS'" % st)
+
+
+def output(line):
+    print(line.encode('utf-8'))
+
+
+def cmd_summary(index, args):
+    summary = index.get_summary()
+    if not summary['runs']:
+        output(u"The index is empty, see the 'rebuild' command.")
+        return 0
+    output(u"%d run(s) archived from %s to %s" % (summary['runs'], format_time(summary['first_archived_at']),
+                                                  format_time(summary['last_archived_at'])))
+    output(u"%d run(s) with a crash dump" % summary['runs_with_crash_dump'])
+    output(u"%.1f MB of files, %.1f MB compressed" % (summary['total_size'] / float(MB),
+                                                     summary['compressed_size'] / float(MB)))
+    output(u"full-text search: %s" % (u"FTS4" if summary['is_full_text_search'] else u"substring only"))
+    output(u"\nruns by restart reason:")
+    for reason, count in summary['restart_reasons']:
+        output(u"  %-40s %6d" % (reason or u"(unknown)", count))
+    return 0
+
+
+def cmd_runs(index, args):
+    runs = index.find_runs(restart_reason=args.reason, has_crash_dump=True if args.crash_dump else None,
+                           file_pattern=args.file, since=args.since, until=args.until, limit=args.limit,
+                           is_latest_first=args.latest)
+    output(u"%-26s %-20s %-20s %-28s %6s %10s %5s" % (
+        u"run", u"archived at", u"last write", u"restart reason", u"files", u"size(MB)", u"dump"))
+    for r in runs:
+        output(u"%-26s %-20s %-20s %-28s %6d %10.1f %5s" % (
+            r['name'], format_time(r['archived_at']), format_time(r['last_mtime']), r['restart_reason'] or u"-",
+            r['file_count'], r['total_size'] / float(MB), u"yes" if r['has_crash_dump'] else u""))
+    output(u"\n%d run(s)" % len(runs))
+    return 0
+
+
+def cmd_files(index, args):
+    if index.get_run(args.run) is None:
+        output(u"No run named '%s' in the index." % args.run)
+        return 1
+    files = index.get_files(args.run)
+    for f in files:
+        output(u"%-60s %12d %12d  %s" % (f['name'], f['size'], f['compressed_size'], format_time(f['mtime'])))
+    return 0
+
+
+def cmd_search(index, args):
+    results = index.search_text(args.query.decode('utf-8'), args.limit)
+    for run_name, archived_at, reason, file_name, snippet in results:
+        output(u"%s  %s (%s)  %s\n    %s" % (run_name, format_time(archived_at), reason or u"-", file_name, snippet))
+    output(u"\n%d match(es)" % len(results))
+    return 0
+
+
+def cmd_rebuild(index, args):
+    cfg = ConfigManager.get_snapshot()
+    is_full_text = cfg.archive_index_full_text if args.full_text is None else args.full_text
+    pattern = cfg.archive_index_full_text_file_pattern if is_full_text else None
+    archive_dir = os.path.dirname(index.get_db_path())
+    # the restart reasons are only known to the index, keep them
+    reasons = index.get_restart_reasons()
+    index.clear()
+    start_time = time.time()
+    zip_paths = sorted(glob.glob(os.path.join(archive_dir, u"*.zip")))
+    indexed = 0
+    for zip_path in zip_paths:
+        name = os.path.splitext(os.path.basename(zip_path))[0]
+        try:
+            index.index_zip(zip_path, reasons.get(name), pattern, cfg.archive_index_full_text_max_file_size)
+        except Exception as ex:
+            output(u"Fail to index '%s': %s" % (zip_path, ex))
+        else:
+            indexed = indexed + 1
+    output(u"Indexed %d/%d archive(s) in %.2fs%s" % (indexed, len(zip_paths), time.time() - start_time,
+                                                     u" with full text" if is_full_text else u""))
+    return 0 if indexed == len(zip_paths) else 1
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Query the index of the archived NS2 server runs.")
+    parser.add_argument('--archive-dir', help="archive dir holding the index (default: from config.json)")
+    sub = parser.add_subparsers(dest='command')
+
+    sub.add_parser('summary', help="overview of the archived runs")
+
+    p = sub.add_parser('runs', help="list the archived runs")
+    p.add_argument('--reason', help="only the runs ended for this restart reason")
+    p.add_argument('--crash-dump', action='store_true', help="only the runs with a crash dump")
+    p.add_argument('--file', metavar='GLOB', help="only the runs with a file matching the pattern")
+    p.add_argument('--since', type=parse_time, help="archived at or after this local time")
+    p.add_argument('--until', type=parse_time, help="archived before this local time")
+    p.add_argument('--latest', action='store_true', help="latest runs first")
+    p.add_argument('--limit', type=int)
+
+    p = sub.add_parser('files', help="list the files of an archived run")
+    p.add_argument('run', help="name of the run, i.e. its zip file name without '.zip'")
+
+    p = sub.add_parser('search', help="full-text search in the archived log files")
+    p.add_argument('query')
+    p.add_argument('--limit', type=int, default=50)
+
+    p = sub.add_parser('rebuild', help="rebuild the index from the zip files of the archive dir")
+    p.add_argument('--full-text', dest='full_text', action='store_true', default=None,
+                   help="index the full text of the log files (default: archive_index_full_text)")
+    p.add_argument('--no-full-text', dest='full_text', action='store_false')
+
+    if len(argv) == 1 or (len(argv) == 3 and argv[1] == '--archive-dir'):
+        argv = argv + ['summary']
+    args = parser.parse_args(argv[1:])
+
+    Logger.set_quiet(True)
+    ConfigManager.load_config(write_default=False)
+    archive_dir = None if args.archive_dir is None else args.archive_dir.decode('utf-8')
+    if archive_dir is None:
+        archive_dir = ConfigManager.get_config('server_config_dir_log_archive')
+    if not os.path.isdir(archive_dir):
+        output(u"The archive dir '%s' does not exist." % archive_dir)
+        return 1
+
+    index = ArchiveIndex(os.path.join(archive_dir, ArchiveIndex.FILE_NAME))
+    try:
+        return {
+            'summary': cmd_summary,
+            'runs': cmd_runs,
+            'files': cmd_files,
+            'search': cmd_search,
+            'rebuild': cmd_rebuild,
+        }[args.command](index, args)
+    finally:
+        index.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,421 @@
+#!/usr/bin/env python2.7
+#  -*- encoding:UTF-8 -*-
+#
+# Restart policy simulator of the NS2 Server Watchdog.
+#
+# The real ServerWatchDog decision logic runs against a virtual clock and a simulated server whose memory usage,
+# heartbeat, tick rate and player count come from a synthetic model or a recorded trace, so days or weeks of
+# operation are replayed in seconds (about 0.5s per simulated day at the default --step 10, ten times more with
+# --step 1). The restarts the watchdog would have made are printed with their reasons.
+# The settings are read from config.json (the defaults if there is none, nothing is written), single keys can be
+# overridden with --set:
+#
+#   python2.7 NS2_Restart_Simulator.py --days 14 --leak-mb-per-hour 40 --set daily_restart_vms_threshold=1073741824
+#   python2.7 NS2_Restart_Simulator.py --days 7 --trace recorded.csv --set "daily_restart_h_m_s=[5, 30, 0]"
+#
+# A recorded trace is a CSV file describing one server run, it's replayed from the beginning after every restart:
+#
+#   uptime,vms,heartbeat,alive,tick_rate,players
+#   0,524288000,0,1,,
+#   60,530000000,1,1,30,4
+#
+# uptime is in seconds since the launch, vms in bytes. Each row holds until the next one: heartbeat is 1 while the
+# helper mod keeps updating its record, alive is 0 once the process is gone. tick_rate and players may be empty.
+
+import argparse
+import bisect
+import csv
+import datetime
+import json
+import math
+import random
+import sys
+import time
+from collections import namedtuple
+
+from NS2_Server_WDT import ConfigManager, Logger, ServerWatchDog
+from Utils.Clock import VirtualClock
+
+# The parts of the watchdog that need a real server or a real network are turned off in the simulation.
+FORCED_OVERRIDES = {
+    'config_hot_reload': False,
+    'perf_metrics_collect': False,
+    'mod_download_stall_check': False,
+    'metrics_http_enable': False,
+    'status_page': False,
+    'cpu_placement': False,
+}
+
+MB = 1024 * 1024
+
+# State of the simulated server at a given uptime. heartbeat is the uptime of the helper mod's last record (None
+# before the first one), failed_at is the uptime of the crash or freeze the server suffered (None if it's healthy).
+TraceSample = namedtuple('TraceSample', ['alive', 'vms', 'heartbeat', 'tick_rate', 'players', 'failed_at'])
+
+Restart = namedtuple('Restart', ['time', 'reason', 'uptime', 'vms', 'unhealthy_for'])
+
+
+class SyntheticTrace:
+    """Every run leaks memory at a constant rate, slows down as it ages, and crashes or freezes at random."""
+
+    def __init__(self, seed, base_vms, leak_rate, crashes_per_day, freezes_per_day, startup_time, tick_rate,
+                 tick_rate_decay, max_players):
+        self.__random = random.Random(seed)
+        self.__base_vms = base_vms
+        self.__leak_rate = leak_rate
+        self.__crash_rate = crashes_per_day / 86400.0
+        self.__freeze_rate = freezes_per_day / 86400.0
+        self.__startup_time = startup_time
+        self.__tick_rate = tick_rate
+        self.__tick_rate_decay = tick_rate_decay
+        self.__max_players = max_players
+
+    def __draw_failure_time(self, rate):
+        if rate <= 0:
+            return float('inf')
+        return self.__random.expovariate(rate)
+
+    def new_run(self):
+        crash_at = self.__draw_failure_time(self.__crash_rate)
+        # the lua engine can't freeze before it got started
+        freeze_at = self.__startup_time + self.__draw_failure_time(self.__freeze_rate)
+        return SyntheticTrace.Run(self, crash_at, freeze_at)
+
+    def sample(self, run, uptime, now):
+        alive = uptime < run.crash_at
+        failed_at = None
+        if run.freeze_at <= uptime:
+            failed_at = run.freeze_at
+        if not alive and (failed_at is None or run.crash_at < failed_at):
+            failed_at = run.crash_at
+
+        # the last update of the helper mod happened at the latest when the server crashed or froze
+        last_alive = min(uptime, run.crash_at, run.freeze_at)
+        heartbeat = last_alive if last_alive >= self.__startup_time else None
+
+        vms = self.__base_vms + self.__leak_rate * min(uptime, run.crash_at)
+        tick_rate = max(self.__tick_rate - self.__tick_rate_decay * uptime / 3600.0, 1.0)
+        # the server is the busiest in the evening and empty from midnight to noon
+        hour = SyntheticTrace.__local_hour(now)
+        players = int(round(self.__max_players * max(0.0, math.sin(math.pi * (hour - 12) / 12))))
+        return TraceSample(alive, vms, heartbeat, tick_rate, players, failed_at)
+
+    @staticmethod
+    def __local_hour(timestamp):
+        t = time.localtime(timestamp)
+        return t.tm_hour + t.tm_min / 60.0
+
+    class Run:
+        def __init__(self, trace, crash_at, freeze_at):
+            self.trace = trace
+            self.crash_at = crash_at
+            self.freeze_at = freeze_at
+
+        def sample(self, uptime, now):
+            return self.trace.sample(self, uptime, now)
+
+
+class RecordedTrace:
+    """Replay a CSV trace of one server run, the last row holds until the server gets restarted."""
+
+    def __init__(self, path):
+        rows = []
+        with open(path, 'rb') as f:
+            for row in csv.DictReader(f):
+                rows.append(row)
+        if not rows:
+            raise ValueError("trace '%s' is empty" % path)
+        rows.sort(key=lambda r: float(r['uptime']))
+
+        self.__uptimes = []
+        # uptime -> (sample of the row, whether the helper mod keeps updating its record until the next row)
+        self.__rows = []
+        last_heartbeat = None
+        crashed_at = None
+        for row in rows:
+            uptime = float(row['uptime'])
+            if crashed_at is None and RecordedTrace.__parse(row, 'alive', int, 1) == 0:
+                crashed_at = uptime
+            alive = crashed_at is None
+            is_beating = alive and RecordedTrace.__parse(row, 'heartbeat', int, 1) != 0
+            if is_beating or (last_heartbeat is not None and last_heartbeat[1]):
+                # the record was last updated when the previous interval ended
+                last_heartbeat = (uptime, is_beating)
+            failed_at = crashed_at
+            if failed_at is None and not is_beating and last_heartbeat is not None:
+                # the helper mod stopped updating its record, it's frozen since then
+                failed_at = last_heartbeat[0]
+            self.__uptimes.append(uptime)
+            self.__rows.append((TraceSample(alive, RecordedTrace.__parse(row, 'vms', float, 0.0),
+                                            None if last_heartbeat is None else last_heartbeat[0],
+                                            RecordedTrace.__parse(row, 'tick_rate', float, None),
+                                            RecordedTrace.__parse(row, 'players', float, None),
+                                            failed_at), is_beating))
+
+    @staticmethod
+    def __parse(row, column, value_type, default):
+        value = (row.get(column) or "").strip()
+        if not value:
+            return default
+        return value_type(value)
+
+    def new_run(self):
+        return self
+
+    def sample(self, uptime, now):
+        i = bisect.bisect_right(self.__uptimes, uptime) - 1
+        if i < 0:
+            # before the first row, the server is still loading
+            return self.__rows[0][0]._replace(heartbeat=None, failed_at=None)
+        sample, is_beating = self.__rows[i]
+        if is_beating:
+            return sample._replace(heartbeat=uptime)
+        return sample
+
+
+class SimulatedServerProcessHandler:
+    """Stands in for ServerProcessHandler, the server's state comes from the trace instead of psutil."""
+
+    def __init__(self, clock, trace):
+        self.__clock = clock
+        self.__trace = trace
+        self.__run = None
+        self.__pid = 0
+        self.__start_time = 0.0
+        self.__forced_record_time = 0.0
+        # the watchdog asks several times per check, the sample is only computed once per clock tick
+        self.__sample_time = None
+        self.__sample = None
+
+    def get_server_abs_root(self):
+        return u"<simulated>"
+
+    def get_server_abs_cfg_dir(self):
+        return u"<simulated>/cfg"
+
+    def get_server_abs_mod_dir(self):
+        return u"<simulated>/mod"
+
+    def get_server_abs_log_dir(self):
+        return u"<simulated>/log"
+
+    def get_helper_mod_record_path(self):
+        return self.get_server_abs_cfg_dir() + u"/server_modding_ping.txt"
+
+    def defer_launch_config(self, cfg):
+        pass
+
+    def set_archive_coalescing(self, is_coalescing):
+        pass
+
+    def track_opened_files(self):
+        pass
+
+    def get_uptime(self):
+        return self.__clock.time() - self.__start_time
+
+    def sample(self):
+        if self.__run is None:
+            return None
+        now = self.__clock.time()
+        if now != self.__sample_time:
+            self.__sample_time = now
+            self.__sample = self.__run.sample(now - self.__start_time, now)
+        return self.__sample
+
+    def restart_server(self, reason=None):
+        self.stop_server(reason)
+        self.start_server()
+
+    def start_server(self):
+        if not self.is_running():
+            self.__pid = self.__pid + 1
+            self.__start_time = self.__clock.time()
+            # like the real handler, the helper mod's record is pushed into the future before the launch
+            self.__forced_record_time = self.__start_time + ConfigManager.get_config(
+                'lua_engine_no_response_threshold')
+            self.__run = self.__trace.new_run()
+            self.__sample_time = None
+
+    def stop_server(self, reason=None):
+        self.__run = None
+
+    def is_running(self):
+        return self.__run is not None and self.sample().alive
+
+    def get_info(self):
+        if not self.is_running():
+            return None
+        vms = int(self.sample().vms)
+        return {
+            'pid': self.__pid,
+            'vms': vms,
+            'rss': vms,
+            'create_time': self.__start_time,
+        }
+
+    def read_helper_mod_record(self):
+        if self.__run is None:
+            raise IOError("the server has never been started")
+        heartbeat = self.sample().heartbeat
+        record_time = self.__forced_record_time if heartbeat is None else self.__start_time + heartbeat
+        return time.strftime(ConfigManager.get_config('lua_engine_helper_mod_record_format'),
+                             time.localtime(record_time))
+
+
+def simulate(watchdog, server, clock, end_time):
+    restarts = []
+    collector = watchdog.get_metrics_collector()
+    watchdog.start_server()
+    while clock.time() < end_time:
+        now = clock.time()
+        uptime = server.get_uptime()
+        sample = server.sample()
+        if sample is not None:
+            # None while the server is kept down by the crash loop guard
+            if sample.tick_rate is not None:
+                collector.add_sample(now, 'tick_rate', sample.tick_rate)
+            if sample.players is not None:
+                collector.add_sample(now, 'players', sample.players)
+
+        reason = watchdog.monitor_once()
+        if reason is not None:
+            unhealthy_for = None if sample.failed_at is None else uptime - sample.failed_at
+            restarts.append(Restart(now, reason, uptime, sample.vms, unhealthy_for))
+        clock.sleep(watchdog.get_monitor_interval())
+    return restarts
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return "%dd %02d:%02d:%02d" % (seconds // 86400, seconds // 3600 % 24, seconds // 60 % 60, seconds % 60)
+
+
+def format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+def print_report(restarts, start_time, end_time, elapsed):
+    print("%-20s %-20s %14s %10s %14s" % ("time", "reason", "uptime", "vms(MB)", "unhealthy_for"))
+    for r in restarts:
+        print("%-20s %-20s %14s %10.1f %14s" % (
+            format_time(r.time), r.reason, format_duration(r.uptime), r.vms / MB,
+            "" if r.unhealthy_for is None else format_duration(r.unhealthy_for)))
+
+    print("\nSimulated %s (%s - %s) in %.2fs, %d restart(s)" % (
+        format_duration(end_time - start_time), format_time(start_time), format_time(end_time), elapsed,
+        len(restarts)))
+    by_reason = {}
+    for r in restarts:
+        by_reason.setdefault(r.reason, []).append(r)
+    for reason in sorted(by_reason):
+        rs = by_reason[reason]
+        print("  %-20s %5d  mean uptime %s, max vms %.1f MB" % (
+            reason, len(rs), format_duration(sum(r.uptime for r in rs) / len(rs)), max(r.vms for r in rs) / MB))
+    unhealthy = [r.unhealthy_for for r in restarts if r.unhealthy_for is not None]
+    if unhealthy:
+        print("  time spent crashed or frozen before the restart: mean %.0fs, max %.0fs, total %s" % (
+            sum(unhealthy) / len(unhealthy), max(unhealthy), format_duration(sum(unhealthy))))
+
+
+def save_csv(restarts, path):
+    with open(path, 'wb') as f:
+        writer = csv.writer(f)
+        writer.writerow(['time', 'reason', 'uptime', 'vms', 'unhealthy_for'])
+        for r in restarts:
+            writer.writerow([format_time(r.time), r.reason, int(r.uptime), int(r.vms),
+                             "" if r.unhealthy_for is None else int(r.unhealthy_for)])
+
+
+def parse_overrides(items):
+    overrides = {}
+    for item in items:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError("expecting key=value, got '%s'" % item)
+        try:
+            overrides[key.strip()] = json.loads(value)
+        except ValueError:
+            # a bare string
+            overrides[key.strip()] = value.decode('utf-8')
+    return overrides
+
+
+def parse_start_time(st):
+    if st is None:
+        today = datetime.date.today()
+        return time.mktime(today.timetuple())
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return time.mktime(datetime.datetime.strptime(st, fmt).timetuple())
+        except ValueError:
+            pass
+    raise ValueError("unknown time format '%s', expecting 'YYYY-MM-DD HH:MM:SS'" % st)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Replay the watchdog's restart decisions against a simulated server.")
+    parser.add_argument('--days', type=float, default=7, help="how long to simulate (default: 7)")
+    parser.add_argument('--start', help="local time the simulation starts at (default: today 00:00:00)")
+    parser.add_argument('--step', type=float, default=10,
+                        help="seconds between two checks, overrides monitor_interval (default: 10, 1 for "
+                             "second-accurate results at ten times the run time)")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="override a key of config.json, the value is parsed as JSON if possible")
+    parser.add_argument('--trace', metavar='CSV', help="replay a recorded trace instead of the synthetic model")
+    parser.add_argument('--seed', type=int, default=0, help="random seed of the simulation")
+    parser.add_argument('--base-vms-mb', type=float, default=512, help="memory usage right after the launch")
+    parser.add_argument('--leak-mb-per-hour', type=float, default=16, help="memory leaked per hour of uptime")
+    parser.add_argument('--crashes-per-day', type=float, default=0.2, help="mean number of crashes per day")
+    parser.add_argument('--freezes-per-day', type=float, default=0.2, help="mean number of lua engine freezes per day")
+    parser.add_argument('--startup-seconds', type=float, default=40, help="time until the helper mod's first record")
+    parser.add_argument('--tick-rate', type=float, default=30, help="tick rate right after the launch")
+    parser.add_argument('--tick-rate-decay', type=float, default=0.1, help="tick rate lost per hour of uptime")
+    parser.add_argument('--max-players', type=int, default=20, help="player count at the evening peak")
+    parser.add_argument('--csv', metavar='PATH', help="also save the restarts into a CSV file")
+    parser.add_argument('--log', action='store_true', help="show the watchdog's log, stamped with the simulated time")
+    args = parser.parse_args(argv[1:])
+
+    try:
+        start_time = parse_start_time(args.start)
+        overrides = parse_overrides(args.set)
+    except ValueError as e:
+        parser.error(str(e))
+    overrides['monitor_interval'] = args.step
+    overrides.update(FORCED_OVERRIDES)
+
+    # the crash loop guard's jitter comes from the random module
+    random.seed(args.seed)
+    clock = VirtualClock(start_time)
+    Logger.set_clock(clock)
+    Logger.set_quiet(not args.log)
+    ConfigManager.load_config(write_default=False)
+    errors = ConfigManager.apply_overrides(overrides)
+    if errors:
+        for e in errors:
+            print(e.encode('utf-8'))
+        return 2
+    if ConfigManager.get_config('monitor_interval') <= 0:
+        parser.error("the monitor interval must be greater than 0")
+
+    if args.trace is not None:
+        trace = RecordedTrace(args.trace)
+    else:
+        trace = SyntheticTrace(args.seed, args.base_vms_mb * MB, args.leak_mb_per_hour * MB / 3600.0,
+                               args.crashes_per_day, args.freezes_per_day, args.startup_seconds, args.tick_rate,
+                               args.tick_rate_decay, args.max_players)
+
+    server = SimulatedServerProcessHandler(clock, trace)
+    watchdog = ServerWatchDog(server=server, clock=clock)
+    end_time = start_time + args.days * 86400
+    real_start_time = time.time()
+    restarts = simulate(watchdog, server, clock, end_time)
+    print_report(restarts, start_time, end_time, time.time() - real_start_time)
+    if args.csv is not None:
+        save_csv(restarts, args.csv)
+        print("\nRestarts saved to %s" % args.csv)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -6,89 +6,138 @@
 # Wrote by John <admin@0x10c.pw>
 # MIT License.
 
+# The first datetime.strptime() imports _strptime without waiting for the import lock, and fails if the ZIP thread is
+# importing its modules at that moment, so it's imported up front.
+import _strptime
 import datetime
 import json
 import os
 import platform
+import random
+import re
 import shlex
 import shutil
 import signal
+import socket
+import struct
 import sys
 import time
-from multiprocessing import Queue
+from Queue import Queue
+from collections import deque, namedtuple
 from subprocess import Popen
 from threading import Thread
-from zipfile import ZipFile, ZIP_DEFLATED
-
-import psutil
 
+from Utils.Clock import SystemClock
+from Utils.DirSizeTracker import DirSizeTracker
+from Utils.LazyModule import LazyModule
+from Utils.LogTailer import LogTailer
+from Utils.PageCacheWarmer import PageCacheWarmer
+from Utils.PrometheusMetrics import Counter, Gauge, Histogram, Registry
+from Utils.StatusPage import CRASH_LOOP_STATES, Status, StatusPageWriter
 from Utils.TextFileWriter import TextFileWriter
+from Utils.TimeSeries import TimeSeries
 
 if cmp(platform.system(), 'Windows') is 0:
     from Utils.WindowsConsoleWriter import WindowsConsoleWriter as PlatformConsoleWriter
     from subprocess import CREATE_NEW_CONSOLE, STARTF_USESHOWWINDOW, STARTUPINFO
 else:
+    import resource
     from Utils.UnixConsoleWriter import UnixConsoleWriter as PlatformConsoleWriter
 
+# The heavy modules are kept off the way to the server's launch. psutil is only needed once the server is spawned,
+# the archive index (sqlite3, zipfile), the profiler and the metrics exporter are imported where they are used.
+psutil = LazyModule('psutil')
+
 VERBOSE_LEVEL = 0
 ExitFlag = False
+# Exit without stopping the server, so the next watchdog can adopt it.
+DetachFlag = False
 
 
 class Logger:
     __TIME_LABEL_PATTERN = '%m/%d/%y-%H:%M:%S'
-    __console_writer = PlatformConsoleWriter()
-    __file_logger = TextFileWriter()
+    # Created on first use, so a quiet run or a tool importing this module doesn't leave an empty log file behind.
+    __console_writer = None
+    __file_logger = None
     __LINE_PATTERN = u"[%s] <%s>: %s\n"
+    __clock = SystemClock()
+    __is_quiet = False
 
     @staticmethod
     def init_logger():
         global VERBOSE_LEVEL
         VERBOSE_LEVEL = ConfigManager.get_config('verbose_level')
 
+    @staticmethod
+    def set_clock(clock):
+        # Log lines are stamped with this clock's time, so a simulated run logs its simulated time.
+        Logger.__clock = clock
+
+    @staticmethod
+    def set_quiet(is_quiet):
+        # Drop everything but the fatal errors.
+        Logger.__is_quiet = is_quiet
+
     def __init__(self):
         raise NotImplementedError(u"This class should never be instantiated.")
 
+    @staticmethod
+    def __get_writers():
+        if Logger.__console_writer is None:
+            Logger.__console_writer = PlatformConsoleWriter()
+            Logger.__file_logger = TextFileWriter()
+        return Logger.__console_writer, Logger.__file_logger
+
     @staticmethod
     def __gen_log_line(str_level, text):
-        log_line = Logger.__LINE_PATTERN % (time.strftime(Logger.__TIME_LABEL_PATTERN, time.localtime(time.time())),
-                                            str_level, text)
+        log_line = Logger.__LINE_PATTERN % (
+            time.strftime(Logger.__TIME_LABEL_PATTERN, time.localtime(Logger.__clock.time())), str_level, text)
         return log_line
 
     @staticmethod
     def debug(text):
-        if VERBOSE_LEVEL >= 2:
+        if VERBOSE_LEVEL >= 2 and not Logger.__is_quiet:
             log_line = Logger.__gen_log_line(u"DEBUG", text)
-            Logger.__console_writer.debug(log_line)
-            Logger.__file_logger.log(log_line)
+            console_writer, file_logger = Logger.__get_writers()
+            console_writer.debug(log_line)
+            file_logger.log(log_line)
 
     @staticmethod
     def verbose(text):
-        if VERBOSE_LEVEL >= 1:
+        if VERBOSE_LEVEL >= 1 and not Logger.__is_quiet:
             log_line = Logger.__gen_log_line(u"VERBOSE", text)
-            Logger.__console_writer.verbose(log_line)
-            Logger.__file_logger.log(log_line)
+            console_writer, file_logger = Logger.__get_writers()
+            console_writer.verbose(log_line)
+            file_logger.log(log_line)
 
     @staticmethod
     def info(text):
+        if Logger.__is_quiet:
+            return
         log_line = Logger.__gen_log_line(u"INFO", text)
-        Logger.__console_writer.normal(log_line)
-        Logger.__file_logger.log(log_line)
+        console_writer, file_logger = Logger.__get_writers()
+        console_writer.normal(log_line)
+        file_logger.log(log_line)
 
     @staticmethod
     def warn(text):
+        if Logger.__is_quiet:
+            return
         log_line = Logger.__gen_log_line(u"WARN", text)
-        Logger.__console_writer.warn(log_line)
-        Logger.__file_logger.log(log_line)
+        console_writer, file_logger = Logger.__get_writers()
+        console_writer.warn(log_line)
+        file_logger.log(log_line)
 
     @staticmethod
     def fatal(text, exitcode=-1):
+        console_writer, file_logger = Logger.__get_writers()
         log_line = Logger.__gen_log_line(u"FATAL", text)
-        Logger.__console_writer.error(log_line)
-        Logger.__file_logger.log(log_line)
+        console_writer.error(log_line)
+        file_logger.log(log_line)
 
         log_line = Logger.__gen_log_line(u"FATAL", (u"Program terminated, exit code: %d." % exitcode))
-        Logger.__console_writer.error(log_line)
-        Logger.__file_logger.log(log_line)
+        console_writer.error(log_line)
+        file_logger.log(log_line)
 
         sys.exit(exitcode)
 
@@ -99,6 +148,11 @@ class ConfigManager:
         # Monitoring interval in second.
         'monitor_interval': 1,
 
+        # Reload this file when it gets modified, without restarting the watchdog or the server.
+        # Changes of the launch settings (the executable, the server dirs, the extra parameter and the Windows
+        # window option) are deferred to the next server restart.
+        'config_hot_reload': True,
+
         # Check whether the lua engine is still alive or not by utilizing the helper mod (mod_id=44AE3979).
         'lua_engine_check_status': True,
 
@@ -120,6 +174,68 @@ class ConfigManager:
         # (in byte). Set it to 0 if you always want the restart to get triggered.
         'daily_restart_vms_threshold': 768 * 1024 * 1024,
 
+        # Collect the server's performance metrics (tick rate, entity count, player count) from the running log dir
+        # and from the extra "name=value" lines of the helper mod's record.
+        'perf_metrics_collect': True,
+
+        # Which files in the running log dir should be parsed for the performance metrics.
+        'perf_metrics_log_file_pattern': u"log-Server*.txt",
+
+        # Regular expressions used to extract the metrics from the server log, group 1 must capture the value.
+        # The entity and player counts are only taken from the helper mod's record by default: any log line with
+        # "player" and a number (an id, a Steam id...) would match a loose pattern, and a wrong player count decides
+        # whether perf_restart_only_when_empty lets the restart happen. Patterns added for them should be anchored to
+        # the whole stats line of your server's log (starting with ^).
+        'perf_metrics_log_patterns': {
+            'tick_rate': u"[Tt]ick ?[Rr]ate\\W{0,3}([0-9]+(?:\\.[0-9]+)?)",
+        },
+
+        # How many samples of each metric should be kept in memory.
+        'perf_metrics_history_size': 3600,
+
+        # Whether restart the server when its tick rate stays below the threshold for too long.
+        'perf_restart': False,
+
+        # Tick rate threshold of the performance restart.
+        'perf_restart_tick_rate_threshold': 20,
+
+        # How long (in seconds) the tick rate must stay below the threshold before restarting.
+        'perf_restart_duration': 600,
+
+        # Only trigger the performance restart when no player is on the server. The player count must be reported,
+        # by the helper mod's record ("players=N") or a 'players' pattern of perf_metrics_log_patterns, otherwise the
+        # performance restart never happens.
+        'perf_restart_only_when_empty': True,
+
+        # Watch the mod storage dir during the server's startup to detect a stuck mod download.
+        'mod_download_stall_check': True,
+
+        # Once the server started downloading mods, restart it if no byte arrived in the mod storage dir for this
+        # many seconds before the helper mod reports the lua engine is up.
+        'mod_download_stall_threshold': 30,
+
+        # Slow down the restarts when the server keeps crashing or freezing (a bad mod, a corrupt map...). The planned
+        # restarts (daily & performance) are not counted. Turning it off starts a server it keeps down right away.
+        'crash_loop_protection': True,
+
+        # Sliding window (in seconds) the unplanned restarts are counted in.
+        'crash_loop_window': 600,
+
+        # From the 2nd unplanned restart in the window, the server is kept down for this many seconds before being
+        # started again, doubled at each further restart (with a random jitter), up to crash_loop_backoff_max.
+        'crash_loop_backoff_base': 10,
+        'crash_loop_backoff_max': 600,
+
+        # Stop restarting the server once this many unplanned restarts happened in the window (0 to never stop).
+        'crash_loop_breaker_threshold': 6,
+
+        # After this many seconds, the stopped server is given one more try (0 to wait until the watchdog gets
+        # restarted). If it survives for crash_loop_window, the restarts go back to normal.
+        'crash_loop_breaker_cooldown': 3600,
+
+        # Shell command run when the restarts get stopped, the reason is in the environment variable NS2WDT_ALERT.
+        'crash_loop_alert_command': u"",
+
         # When designating a path, if you give a relative path, it will be expended according to the running cwd
         # NS2Server's root path
         'server_config_executable_path': u"C:/NS2Server",  # or "/opt/NS2Server/serverfiles" for example
@@ -143,56 +259,449 @@ class ConfigManager:
         'server_config_extra_parameter':
             u"-name 'Test' -port 27015 -map 'ns2_veil' -limit 20 -speclimit 4 -mods '44AE3979'",
 
+        # Take over the server left running by the previous watchdog (because it crashed, or was told to exit with
+        # SIGUSR2) instead of launching a new one, so restarting the watchdog doesn't interrupt the game.
+        'adopt_running_server': True,
+
+        # Where the running server's pid, creation time, command line and log dir are kept for the adoption, and why
+        # it was stopped once it is, for the archive index.
+        'adopt_state_file': u"./server_state.json",
+
+        # Read the map and mod files the server is about to load into the OS file cache with parallel readers while
+        # the previous server is shutting down, so it loads them from memory. With no shutdown to overlap (first
+        # launch, crash), they're read along with the launch.
+        'prewarm_page_cache': False,
+
+        # At most this many bytes are read, by this many readers.
+        'prewarm_byte_budget': 2 * 1024 * 1024 * 1024,
+        'prewarm_readers': 4,
+
+        # How long (in seconds) a restart may wait for the pre-warm to complete once the shutdown is over, the rest
+        # is skipped.
+        'prewarm_max_wait': 10,
+
+        # The files the server opens until the helper mod comes online are recorded here and read first at the next
+        # launch, followed by the files of the -map and -mods launch parameters.
+        'prewarm_record_file': u"./prewarm_files.json",
+
+        # Keep a SQLite index of the archived runs (archive_index.sqlite3 in the archive dir): their files, whether
+        # they have a crash dump and why they ended. Search it with NS2_Archive_Index.py.
+        'archive_index': True,
+
+        # Also index the full text of the archived log files matching the pattern, up to the size limit (in byte).
+        'archive_index_full_text': False,
+        'archive_index_full_text_file_pattern': u"*.txt",
+        'archive_index_full_text_max_file_size': 16 * 1024 * 1024,
+
         # Windows OS specific: hide server window
         'win_os_hide_server_window': False,
 
+        # Manage the CPU placement of the server and of the watchdog (with its compression thread), so the
+        # server's tick doesn't compete with them. Linux & Windows only.
+        'cpu_placement': False,
+
+        # Pin the server to these CPUs (numbered from 0), the watchdog then keeps off them. An empty list leaves both
+        # on every CPU.
+        'cpu_affinity_server': [],
+
+        # Nice value (-20 for the highest priority to 19 for the lowest) of the server and of the watchdog. Raising
+        # the priority needs root on Linux. On Windows it's mapped to the closest priority class.
+        'cpu_nice_server': 0,
+        'cpu_nice_watchdog': 10,
+
+        # How often (in seconds) the placement is checked and restored if something else changed it, 0 to only
+        # apply it when the server starts.
+        'cpu_placement_check_interval': 60,
+
+        # Serve the watchdog's metrics in the Prometheus text format at http://<address>:<port>/metrics
+        # Keep the address on localhost unless the port is protected by a firewall.
+        'metrics_http_enable': False,
+        'metrics_http_address': u"127.0.0.1",
+        'metrics_http_port': 9715,
+
+        # Publish the watchdog's live status (pids, uptime, heartbeat age, last restart, memory, archive backlog) into
+        # a small memory-mapped file, updated in place every monitoring interval. Read it with NS2_Watchdog_Status.py.
+        'status_page': True,
+        'status_page_path': u"./watchdog_status.bin",
+
         # Output verbose level, 0 for lowest and 2 for highest.
         'verbose_level': 1
     }
 
+    # Changes of these settings only take effect when the server process gets (re)started.
+    RESTART_REQUIRED_KEYS = frozenset([
+        'server_config_executable_path', 'server_config_executable_name',
+        'server_config_dir_cfg', 'server_config_dir_mod', 'server_config_dir_log', 'server_config_dir_log_archive',
+        'server_config_extra_parameter', 'win_os_hide_server_window',
+    ])
+
+    # Numeric settings which may be negative.
+    __SIGNED_KEYS = frozenset(['cpu_nice_server', 'cpu_nice_watchdog'])
+
+    # Intervals, windows and tolerances, 0 would turn the main loop into a busy loop or make every check fail at once.
+    __POSITIVE_KEYS = frozenset(['monitor_interval', 'lua_engine_no_response_threshold', 'perf_restart_duration',
+                                 'mod_download_stall_threshold', 'crash_loop_window'])
+
+    # Immutable view of the validated config, lists are frozen into tuples and dicts into sorted (key, value) tuples.
+    ConfigSnapshot = namedtuple('ConfigSnapshot', sorted(__DEFAULT_CONFIG.keys()))
+
     __config = None
+    __snapshot = None
+    __config_file_signature = None
 
     def __init__(self):
         raise NotImplementedError(u"This class should never be instantiated.")
 
     @staticmethod
     def get_config(key):
-        if ConfigManager.__config is None:
+        return getattr(ConfigManager.get_snapshot(), key)
+
+    @staticmethod
+    def get_snapshot():
+        if ConfigManager.__snapshot is None:
             ConfigManager.load_config()
-        return ConfigManager.__config[key]
+        return ConfigManager.__snapshot
 
     @staticmethod
     def save_config():
         with open(ConfigManager.__CONFIG_FILENAME, 'w') as f:
-            content = json.dumps(ConfigManager.__config, indent=4, sort_keys=True, encoding='utf-8', ensure_ascii=False)
-            f.write(content.encode('utf-8'))
+            f.write(ConfigManager.__dump_config())
         Logger.info(u"Flushed config to '%s'" % ConfigManager.__CONFIG_FILENAME)
 
     @staticmethod
-    def load_config():
+    def __dump_config():
+        content = json.dumps(ConfigManager.__config, indent=4, sort_keys=True, encoding='utf-8', ensure_ascii=False)
+        return content.encode('utf-8')
+
+    @staticmethod
+    def load_config(write_default=True):
+        """Load and validate config.json, the defaults are used for the missing keys.
+
+        With write_default, config.json is created or completed with the defaults. The tools sharing the config pass
+        False, so running them doesn't leave a config.json behind.
+        """
         ConfigManager.__config = {}
+        file_content = None
         if os.path.exists(ConfigManager.__CONFIG_FILENAME):
             Logger.info(u"Loading config from file '%s'" % ConfigManager.__CONFIG_FILENAME)
             with open(ConfigManager.__CONFIG_FILENAME) as json_file:
-                try:
-                    json_data = json.load(json_file, encoding='utf-8')
-                except ValueError:
-                    Logger.fatal(u"Invalid config.json, please check it.")
-                else:
-                    for i, v in ConfigManager.__DEFAULT_CONFIG.items():
-                        if i in json_data:
-                            ConfigManager.__config[i] = json_data[i]
-                        else:
-                            ConfigManager.__config[i] = ConfigManager.__DEFAULT_CONFIG[i]
-        else:
+                file_content = json_file.read()
+            try:
+                json_data = json.loads(file_content, encoding='utf-8')
+            except ValueError:
+                Logger.fatal(u"Invalid config.json, please check it.")
+            else:
+                ConfigManager.__config = ConfigManager.__merge_with_default(json_data)
+        elif write_default:
             Logger.info(u"File '%s' not found, a new one will be created" % ConfigManager.__CONFIG_FILENAME)
-            ConfigManager.__config = ConfigManager.__DEFAULT_CONFIG
-        ConfigManager.save_config()
+            ConfigManager.__config = dict(ConfigManager.__DEFAULT_CONFIG)
+        else:
+            Logger.info(u"File '%s' not found, using the default config" % ConfigManager.__CONFIG_FILENAME)
+            ConfigManager.__config = dict(ConfigManager.__DEFAULT_CONFIG)
+
+        errors = ConfigManager.__validate_config(ConfigManager.__config)
+        if errors:
+            for e in errors:
+                Logger.warn(e)
+            Logger.fatal(u"Invalid config.json, please check it.")
+        ConfigManager.__snapshot = ConfigManager.__make_snapshot(ConfigManager.__config)
+        # only write the file back when it misses some keys or isn't formatted like we would do
+        if write_default and file_content != ConfigManager.__dump_config():
+            ConfigManager.save_config()
+        ConfigManager.__config_file_signature = ConfigManager.__get_config_file_signature()
         Logger.info(u"Config loaded")
 
+    @staticmethod
+    def reload_config_if_changed():
+        """Reload config.json if it has been modified since it was loaded last time.
+
+        Returns a (new snapshot, list of changed keys) tuple, or None if the file didn't change or the new content
+        is invalid, in which case the current snapshot stays in effect.
+        """
+        signature = ConfigManager.__get_config_file_signature()
+        if signature is None or signature == ConfigManager.__config_file_signature:
+            return None
+        ConfigManager.__config_file_signature = signature
+
+        Logger.info(u"Change of '%s' detected, reloading config" % ConfigManager.__CONFIG_FILENAME)
+        try:
+            with open(ConfigManager.__CONFIG_FILENAME) as json_file:
+                json_data = json.load(json_file, encoding='utf-8')
+        except (IOError, ValueError):
+            Logger.warn(u"Fail to read the modified config.json, keep using the current config.")
+            return None
+
+        config = ConfigManager.__merge_with_default(json_data)
+        errors = ConfigManager.__validate_config(config)
+        if errors:
+            for e in errors:
+                Logger.warn(e)
+            Logger.warn(u"Invalid config.json, keep using the current config.")
+            return None
+
+        old_snapshot = ConfigManager.__snapshot
+        new_snapshot = ConfigManager.__make_snapshot(config)
+        changed_keys = [k for k in new_snapshot._fields if getattr(new_snapshot, k) != getattr(old_snapshot, k)]
+        ConfigManager.__config = config
+        ConfigManager.__snapshot = new_snapshot
+        return new_snapshot, changed_keys
+
+    @staticmethod
+    def apply_overrides(overrides):
+        """Override some keys of the loaded config in memory only, config.json is left untouched.
+
+        Returns the list of validation errors, the current config stays in effect if it's not empty.
+        """
+        ConfigManager.get_snapshot()
+        unknown_keys = [k for k in overrides if k not in ConfigManager.__DEFAULT_CONFIG]
+        if unknown_keys:
+            return [u"Unknown config '%s'" % k for k in sorted(unknown_keys)]
+        config = dict(ConfigManager.__config)
+        config.update(overrides)
+        errors = ConfigManager.__validate_config(config)
+        if errors:
+            return errors
+        ConfigManager.__config = config
+        ConfigManager.__snapshot = ConfigManager.__make_snapshot(config)
+        return []
+
+    @staticmethod
+    def __get_config_file_signature():
+        try:
+            st = os.stat(ConfigManager.__CONFIG_FILENAME)
+        except OSError:
+            return None
+        return st.st_mtime, st.st_size
+
+    @staticmethod
+    def __merge_with_default(json_data):
+        config = {}
+        for i, v in ConfigManager.__DEFAULT_CONFIG.items():
+            if i in json_data:
+                config[i] = json_data[i]
+            else:
+                config[i] = v
+        return config
+
+    @staticmethod
+    def __validate_config(config):
+        errors = []
+        for key, default in ConfigManager.__DEFAULT_CONFIG.items():
+            value = config[key]
+            if isinstance(default, bool):
+                is_valid = isinstance(value, bool)
+            elif isinstance(default, (int, long, float)):
+                is_valid = isinstance(value, (int, long, float)) and not isinstance(value, bool) and (
+                    value >= 0 or key in ConfigManager.__SIGNED_KEYS)
+                if is_valid and key in ConfigManager.__POSITIVE_KEYS and value <= 0:
+                    errors.append(u"Invalid value '%s' of config '%s', expecting a value > 0" % (
+                        json.dumps(value), key))
+                    continue
+            elif isinstance(default, basestring):
+                is_valid = isinstance(value, basestring)
+            else:
+                is_valid = isinstance(value, type(default))
+            if not is_valid:
+                errors.append(u"Invalid value '%s' of config '%s', expecting a value like '%s'" % (
+                    json.dumps(value), key, json.dumps(default)))
+
+        hms = config['daily_restart_h_m_s']
+        if not (isinstance(hms, list) and len(hms) == 3 and
+                all(isinstance(i, (int, long)) and not isinstance(i, bool) for i in hms) and
+                0 <= hms[0] < 24 and 0 <= hms[1] < 60 and 0 <= hms[2] < 60):
+            errors.append(u"Invalid value '%s' of config 'daily_restart_h_m_s', expecting [hh, mm, ss]" % (
+                json.dumps(hms)))
+
+        patterns = config['perf_metrics_log_patterns']
+        if isinstance(patterns, dict):
+            for name, pattern in patterns.items():
+                try:
+                    re.compile(pattern)
+                except (re.error, TypeError):
+                    errors.append(u"Invalid regular expression '%s' for the performance metric '%s'" % (
+                        pattern, name))
+
+        cpus = config['cpu_affinity_server']
+        cpu_count = psutil.cpu_count() if cpus else 0
+        if not (isinstance(cpus, list) and all(isinstance(i, (int, long)) and not isinstance(i, bool) and
+                                               0 <= i < cpu_count for i in cpus)):
+            errors.append(u"Invalid value '%s' of config 'cpu_affinity_server', expecting a list of CPUs in [0, %d]" % (
+                json.dumps(cpus), cpu_count - 1))
+        for key in ('cpu_nice_server', 'cpu_nice_watchdog'):
+            nice = config[key]
+            if not (isinstance(nice, (int, long)) and not isinstance(nice, bool) and -20 <= nice <= 19):
+                errors.append(u"Invalid value '%s' of config '%s', expecting an integer in [-20, 19]" % (
+                    json.dumps(nice), key))
+        readers = config['prewarm_readers']
+        if not (isinstance(readers, (int, long)) and not isinstance(readers, bool) and readers >= 1):
+            errors.append(u"Invalid value '%s' of config 'prewarm_readers', expecting an integer >= 1" % (
+                json.dumps(readers)))
+        return errors
+
+    @staticmethod
+    def __make_snapshot(config):
+        def freeze(v):
+            if isinstance(v, list):
+                return tuple(freeze(i) for i in v)
+            if isinstance(v, dict):
+                return tuple(sorted((k, freeze(i)) for k, i in v.items()))
+            return v
+
+        return ConfigManager.ConfigSnapshot(**dict((k, freeze(v)) for k, v in config.items()))
+
+
+class WatchdogMetrics:
+    # The metrics are updated in place by the monitor loop and the ZIP thread, the HTTP exporter's thread only
+    # reads them when rendering, so a scrape never blocks the monitor loop.
+    registry = Registry()
+
+    restarts = registry.register(Counter(
+        u"ns2wdt_restarts_total", u"Server restarts performed by the watchdog, by reason.", ('reason',)))
+    loop_iterations = registry.register(Counter(
+        u"ns2wdt_loop_iterations_total", u"Iterations of the watchdog's monitor loop."))
+    crash_loop_restarts = registry.register(Gauge(
+        u"ns2wdt_crash_loop_restarts", u"Unplanned restarts in the crash loop detection window."))
+    crash_loop_hold_seconds = registry.register(Gauge(
+        u"ns2wdt_crash_loop_hold_seconds", u"Seconds until the server kept down by the backoff gets started."))
+    crash_loop_breaker_open = registry.register(Gauge(
+        u"ns2wdt_crash_loop_breaker_open", u"Whether the restarts are stopped because of a crash loop."))
+    crash_loop_breaker_trips = registry.register(Counter(
+        u"ns2wdt_crash_loop_breaker_trips_total", u"Times the restarts got stopped because of a crash loop."))
+
+    # Buckets of the timing histograms, in seconds.
+    TIMING_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                      1.0, 2.5, 5.0, 10.0, 30.0)
+    # The CPU time is the whole watchdog process's, so it includes the ZIP thread and the exporter thread.
+    loop_wall_time = registry.register(Histogram(
+        u"ns2wdt_loop_wall_seconds", u"Wall time of a monitor loop iteration, excluding the sleep.", TIMING_BUCKETS))
+    loop_cpu_time = registry.register(Histogram(
+        u"ns2wdt_loop_cpu_seconds", u"Process CPU time of a monitor loop iteration.", TIMING_BUCKETS))
+    check_wall_time = registry.register(Histogram(
+        u"ns2wdt_check_wall_seconds", u"Wall time of each check.", TIMING_BUCKETS, ('check',)))
+    check_cpu_time = registry.register(Histogram(
+        u"ns2wdt_check_cpu_seconds", u"Process CPU time of each check.", TIMING_BUCKETS, ('check',)))
+
+    server_up = registry.register(Gauge(
+        u"ns2wdt_server_up", u"Whether the server process is running."))
+    server_start_time = registry.register(Gauge(
+        u"ns2wdt_server_start_time_seconds", u"Unix time the server process was created."))
+    server_vms = registry.register(Gauge(
+        u"ns2wdt_server_vms_bytes", u"Virtual memory size of the server process."))
+    server_rss = registry.register(Gauge(
+        u"ns2wdt_server_rss_bytes", u"Resident set size of the server process."))
+    heartbeat_age = registry.register(Gauge(
+        u"ns2wdt_heartbeat_age_seconds", u"Age of the helper mod's last record."))
+    server_performance = registry.register(Gauge(
+        u"ns2wdt_server_performance", u"Latest performance metrics reported by the server.", ('metric',)))
+    mod_download_throughput = registry.register(Gauge(
+        u"ns2wdt_mod_download_bytes_per_second", u"Mod download throughput during the server's startup."))
+
+    archive_queue_depth = registry.register(Gauge(
+        u"ns2wdt_archive_queue_depth", u"Archives waiting to be compressed."))
+    archive_jobs = registry.register(Counter(
+        u"ns2wdt_archive_jobs_total", u"Archives compressed."))
+    archive_bytes = registry.register(Counter(
+        u"ns2wdt_archive_bytes_total", u"Uncompressed bytes of the archived files."))
+    archive_seconds = registry.register(Counter(
+        u"ns2wdt_archive_seconds_total", u"Wall time spent on compressing archives."))
+    archive_last_throughput = registry.register(Gauge(
+        u"ns2wdt_archive_last_throughput_bytes_per_second", u"Compression throughput of the last archive."))
+
+    __exporter = None
+    __exporter_endpoint = None
+
+    def __init__(self):
+        raise NotImplementedError(u"This class should never be instantiated.")
+
+    @staticmethod
+    def apply_config(cfg):
+        endpoint = (cfg.metrics_http_address, cfg.metrics_http_port) if cfg.metrics_http_enable else None
+        if endpoint == WatchdogMetrics.__exporter_endpoint:
+            return
+        WatchdogMetrics.stop_exporter()
+        if endpoint is not None:
+            if WatchdogMetrics.__exporter is None:
+                from Utils.MetricsHTTPExporter import MetricsHTTPExporter
+                WatchdogMetrics.__exporter = MetricsHTTPExporter(WatchdogMetrics.registry)
+            try:
+                WatchdogMetrics.__exporter.start(endpoint[0], endpoint[1])
+            except socket.error as ex:
+                Logger.warn(u"Fail to serve the metrics at %s:%d (%s)" % (endpoint[0], endpoint[1], ex))
+                return
+            Logger.info(u"Serving metrics at http://%s:%d/metrics" % endpoint)
+        WatchdogMetrics.__exporter_endpoint = endpoint
+
+    @staticmethod
+    def stop_exporter():
+        if WatchdogMetrics.__exporter is not None and WatchdogMetrics.__exporter.is_running():
+            WatchdogMetrics.__exporter.stop()
+        WatchdogMetrics.__exporter_endpoint = None
+
+
+class WatchdogProfiler:
+    # Toggled by SIGUSR1, the profile only covers the main thread (the monitor loop).
+    __PROFILE_STORAGE_DIR = u"./log"
+    __PROFILE_FILE_PATTERN = u"%s-Watchdog-profile"
+    __PROFILE_DATE_PATTERN = '%Y-%m-%d_%H-%M-%S'
+    __PROFILE_REPORT_LINES = 60
+
+    __is_toggle_requested = False
+    __profiler = None
+
+    def __init__(self):
+        raise NotImplementedError(u"This class should never be instantiated.")
+
+    @staticmethod
+    def request_toggle():
+        # Only sets a flag, so it's safe to be called from a signal handler.
+        WatchdogProfiler.__is_toggle_requested = True
+
+    @staticmethod
+    def poll():
+        if WatchdogProfiler.__is_toggle_requested:
+            WatchdogProfiler.__is_toggle_requested = False
+            if WatchdogProfiler.__profiler is None:
+                WatchdogProfiler.start()
+            else:
+                WatchdogProfiler.stop()
+
+    @staticmethod
+    def start():
+        if WatchdogProfiler.__profiler is not None:
+            return
+        import cProfile
+        WatchdogProfiler.__profiler = cProfile.Profile()
+        WatchdogProfiler.__profiler.enable()
+        Logger.info(u"Profiler started.")
+
+    @staticmethod
+    def stop():
+        profiler = WatchdogProfiler.__profiler
+        if profiler is None:
+            return
+        profiler.disable()
+        WatchdogProfiler.__profiler = None
+
+        base_name = WatchdogProfiler.__PROFILE_STORAGE_DIR + u"/" + WatchdogProfiler.__PROFILE_FILE_PATTERN % (
+            time.strftime(WatchdogProfiler.__PROFILE_DATE_PATTERN, time.localtime(time.time())))
+        try:
+            if not os.path.isdir(WatchdogProfiler.__PROFILE_STORAGE_DIR):
+                os.mkdir(WatchdogProfiler.__PROFILE_STORAGE_DIR)
+            profiler.dump_stats(base_name + u".prof")
+            import pstats
+            with open(base_name + u".txt", 'w') as f:
+                stats = pstats.Stats(profiler, stream=f)
+                stats.sort_stats('cumulative').print_stats(WatchdogProfiler.__PROFILE_REPORT_LINES)
+        except (IOError, OSError) as ex:
+            Logger.warn(u"Fail to dump the profile to '%s' (%s)" % (base_name, ex))
+        else:
+            Logger.info(u"Profiler stopped, stats dumped to '%s.prof' and '%s.txt'" % (base_name, base_name))
+
 
 class ASyncZipper(object):
     task_queue = Queue()
+    # archive dir -> ArchiveIndex, only used by the ZIP thread
+    __indexes = {}
 
     def __init__(self):
         raise RuntimeError(u"This class is not intend to be instantiated directly")
@@ -203,45 +712,95 @@ class ASyncZipper(object):
         while True:
             job_desc = ASyncZipper.task_queue.get(block=True, timeout=None)
 
-            # [source_path, dest_zip_name, remove_src_after_zip]
+            # [source_path, dest_zip_name, remove_src_after_zip, index_options]
             assert isinstance(job_desc, list)
-            assert len(job_desc) == 3
+            assert len(job_desc) == 4
 
             zip_src_path = job_desc[0]
             zip_dest_path = job_desc[1]
             zip_remove_src_after_zip = job_desc[2]
+            index_options = job_desc[3]
 
             if zip_src_path is None and zip_dest_path is None and zip_remove_src_after_zip is None:
                 # received quit request
                 break
-            ASyncZipper.zip_folder(zip_src_path, zip_dest_path, zip_remove_src_after_zip)
+            ASyncZipper.zip_folder(zip_src_path, zip_dest_path, zip_remove_src_after_zip, index_options)
+            WatchdogMetrics.archive_queue_depth.dec()
+
+        for index in ASyncZipper.__indexes.values():
+            index.close()
+        ASyncZipper.__indexes = {}
 
     @staticmethod
-    def zip_folder(zip_src_path, zip_dest_path, zip_remove_src_after_zip):
+    def zip_folder(zip_src_path, zip_dest_path, zip_remove_src_after_zip, index_options=None):
         assert isinstance(zip_src_path, unicode) and \
                isinstance(zip_dest_path, unicode) and \
                isinstance(zip_remove_src_after_zip, bool)
         if not os.path.isdir(zip_src_path):
             Logger.warn(u"Couldn't find %s folder anymore, aborting zipping process!" % zip_src_path)
             return
+        from zipfile import ZipFile, ZIP_DEFLATED
+        if index_options is not None:
+            from Utils.ArchiveIndex import ArchiveIndex
         tmp_file_name = zip_dest_path + ".zipping"
         Logger.verbose(u"Zipping '%s'" % zip_src_path)
 
+        start_time = time.time()
+        total_size = 0
+        # (name, size, compressed size, mtime) and (name, content) for the archive index
+        indexed_files = []
+        indexed_texts = []
         with ZipFile(tmp_file_name, "w", ZIP_DEFLATED) as z:
             for root, dirs, files in os.walk(zip_src_path):
                 # NOTE: ignores empty directories
                 for fn in files:
                     absfn = os.path.join(root, fn)
-                    zfn = os.path.basename(absfn)
+                    # keep the sub folders of a coalesced archive apart
+                    zfn = os.path.relpath(absfn, zip_src_path).replace(os.sep, u"/")
                     z.write(absfn, zfn)
+                    info = z.getinfo(zfn)
+                    total_size = total_size + info.file_size
+                    if index_options is not None:
+                        indexed_files.append((zfn, info.file_size, info.compress_size, os.path.getmtime(absfn)))
+                        if ArchiveIndex.is_full_text_candidate(zfn, info.file_size,
+                                                               index_options['full_text_pattern'],
+                                                               index_options['full_text_max_size']):
+                            with open(absfn, 'rb') as f:
+                                indexed_texts.append((zfn, f.read().decode('utf-8', 'replace')))
+        elapsed = time.time() - start_time
+
+        WatchdogMetrics.archive_jobs.inc()
+        WatchdogMetrics.archive_bytes.inc(total_size)
+        WatchdogMetrics.archive_seconds.inc(elapsed)
+        if elapsed > 0:
+            WatchdogMetrics.archive_last_throughput.set(total_size / elapsed)
 
         # time.sleep(1)
         if os.path.exists(tmp_file_name):
             os.rename(tmp_file_name, zip_dest_path)
         Logger.verbose(u"Zipped '%s'" % zip_src_path)
+        if index_options is not None:
+            ASyncZipper.__index_run(zip_dest_path, index_options['restart_reason'], indexed_files, indexed_texts)
         if zip_remove_src_after_zip:
             shutil.rmtree(zip_src_path)
 
+    @staticmethod
+    def __index_run(zip_dest_path, restart_reason, files, texts):
+        import sqlite3
+        from Utils.ArchiveIndex import ArchiveIndex
+        archive_dir = os.path.dirname(zip_dest_path)
+        try:
+            index = ASyncZipper.__indexes.get(archive_dir)
+            if index is None:
+                index = ArchiveIndex(os.path.join(archive_dir, ArchiveIndex.FILE_NAME))
+                ASyncZipper.__indexes[archive_dir] = index
+            name = os.path.splitext(os.path.basename(zip_dest_path))[0]
+            index.add_run(name, time.time(), restart_reason, files, texts)
+        except sqlite3.Error as ex:
+            Logger.warn(u"Fail to index the archive '%s' (%s)" % (zip_dest_path, ex))
+        else:
+            Logger.debug(u"Indexed '%s', %d file(s), %d full text(s)" % (zip_dest_path, len(files), len(texts)))
+
     working_thread = Thread(target=working_thread_run.__func__)
 
     @staticmethod
@@ -249,12 +808,21 @@ class ASyncZipper(object):
         ASyncZipper.working_thread.join()
 
     @staticmethod
-    def request_zip(src_dir, dest_zip_path, del_src_after_zip=True):
+    def request_zip(src_dir, dest_zip_path, del_src_after_zip=True, restart_reason=None):
         assert isinstance(src_dir, unicode)
         assert isinstance(dest_zip_path, unicode)
         assert isinstance(del_src_after_zip, bool)
 
-        ASyncZipper.task_queue.put([src_dir, dest_zip_path, del_src_after_zip])
+        cfg = ConfigManager.get_snapshot()
+        index_options = None
+        if cfg.archive_index:
+            index_options = {
+                'restart_reason': restart_reason,
+                'full_text_pattern': cfg.archive_index_full_text_file_pattern if cfg.archive_index_full_text else None,
+                'full_text_max_size': cfg.archive_index_full_text_max_file_size,
+            }
+        WatchdogMetrics.archive_queue_depth.inc()
+        ASyncZipper.task_queue.put([src_dir, dest_zip_path, del_src_after_zip, index_options])
 
     @staticmethod
     def start_worker_thread():
@@ -264,7 +832,7 @@ class ASyncZipper(object):
     @staticmethod
     def stop_worker_thread():
         if ASyncZipper.working_thread.isAlive():
-            ASyncZipper.task_queue.put([None, None, None])
+            ASyncZipper.task_queue.put([None, None, None, None])
 
 
 class ServerProcessHandler:
@@ -272,56 +840,99 @@ class ServerProcessHandler:
     __WAIT_TIME_BEFORE_GIVE_UP = 60
 
     def __init__(self):
-        self.__server_root = ConfigManager.get_config('server_config_executable_path')
-        if not os.path.isabs(self.__server_root):
-            Logger.verbose(u"You are using relative path '%s' to specify the server root" % self.__server_root)
-            self.__server_root = os.path.abspath(self.__server_root)
+        cfg = ConfigManager.get_snapshot()
+        err = self.__check_launch_config(cfg)
+        if err is not None:
+            Logger.fatal(err)
+        self.__apply_launch_config(cfg)
+        self.__pending_launch_config = None
+        self.__is_archive_coalescing = False
+        self.__held_archive_dir = None
+        self.__held_archive_reasons = []
+        # Why the previous run ended, recorded in the archive index along with its running history. The previous
+        # watchdog leaves it in the state file when it stops the server.
+        state = self.__load_state()
+        self.__end_reason = (state.get('end_reason') if isinstance(state, dict) else None) or u"watchdog_start"
+
+        self.__pid = -1
+        self.__process = None
+        self.__ps = None
+        self.__ps_cmdline = None
+        self.__ps_create_time = 0.0
+
+        self.__page_cache_warmer = None
+        self.__background_page_cache_warmer = None
+        # files the starting server opened, None once the helper mod is online
+        self.__opened_files = None
+        self.__launch_time = 0.0
+
+    @staticmethod
+    def __check_launch_config(cfg):
+        # Return the error message if the server couldn't be launched with the given config, otherwise None.
+        server_root = cfg.server_config_executable_path
+        if not os.path.isabs(server_root):
+            Logger.verbose(u"You are using relative path '%s' to specify the server root" % server_root)
+            server_root = os.path.abspath(server_root)
             Logger.verbose(
-                u"DOUBLE CHECK: The absolute path for the server root is '%s'. Is that correct?" % self.__server_root)
+                u"DOUBLE CHECK: The absolute path for the server root is '%s'. Is that correct?" % server_root)
 
-        if not os.path.isdir(self.__server_root):
-            Logger.fatal(u"The root of NS2Server ('%s') does not exist" % self.__server_root)
+        if not os.path.isdir(server_root):
+            return u"The root of NS2Server ('%s') does not exist" % server_root
 
         key_dir = ['server_config_dir_cfg', 'server_config_dir_mod',
                    'server_config_dir_log', 'server_config_dir_log_archive']
         for kd in key_dir:
-            vd = ConfigManager.get_config(kd)
+            vd = getattr(cfg, kd)
             if not os.path.isdir(vd):
-                Logger.fatal(
-                    u"Fail to start server, because directory '%s' does not exist (value of '%s')" % (vd, kd))
+                return u"Fail to start server, because directory '%s' does not exist (value of '%s')" % (vd, kd)
             if not os.path.isabs(vd):
                 Logger.verbose(u"You are using relative path '%s' for config '%s')" % (vd, kd))
 
                 Logger.verbose(u"DOUBLE CHECK: The absolute path for the config '%s' is '%s'. Is that correct?" % (
                     kd, os.path.abspath(vd)))
 
-        self.__server_dir_cfg = os.path.abspath(ConfigManager.get_config('server_config_dir_cfg'))
-        self.__server_dir_mod = os.path.abspath(ConfigManager.get_config('server_config_dir_mod'))
-        self.__server_dir_log = os.path.abspath(ConfigManager.get_config('server_config_dir_log'))
-        self.__server_dir_log_backup = os.path.abspath(ConfigManager.get_config('server_config_dir_log_archive'))
-
-        sub_dir = u"/x64/"
-        if cmp(platform.architecture()[0], '64bit') is not 0:
-            Logger.fatal(u"You are running 32bit OS, which is not supported by NS2DS anymore. Consider upgrading.")
+        # platform.architecture() would run the "file" command on the interpreter to find out the same
+        if struct.calcsize('P') * 8 != 64:
+            return u"You are running 32bit OS, which is not supported by NS2DS anymore. Consider upgrading."
 
-        executable_path = self.__server_root + sub_dir + ConfigManager.get_config('server_config_executable_name')
+        executable_path = server_root + u"/x64/" + cfg.server_config_executable_name
         if not os.path.isfile(executable_path):
-            Logger.fatal(u"Fail to start server, because executable file '%s' does not exist" % executable_path)
+            return u"Fail to start server, because executable file '%s' does not exist" % executable_path
 
         if not os.access(executable_path, os.X_OK):
-            Logger.fatal(u"You have no execute privilege on server's executable image: %s" % executable_path)
+            return u"You have no execute privilege on server's executable image: %s" % executable_path
 
+        try:
+            shlex.split(cfg.server_config_extra_parameter.encode('utf-8'))
+        except ValueError:
+            return u"Fail to parse the server's extra parameter: %s" % cfg.server_config_extra_parameter
+        return None
+
+    def __apply_launch_config(self, cfg):
+        self.__server_root = os.path.abspath(cfg.server_config_executable_path)
+        self.__server_dir_cfg = os.path.abspath(cfg.server_config_dir_cfg)
+        self.__server_dir_mod = os.path.abspath(cfg.server_config_dir_mod)
+        self.__server_dir_log = os.path.abspath(cfg.server_config_dir_log)
+        self.__server_dir_log_backup = os.path.abspath(cfg.server_config_dir_log_archive)
+        self.__is_hide_server_window = cfg.win_os_hide_server_window
+
+        executable_path = self.__server_root + u"/x64/" + cfg.server_config_executable_name
         param = [executable_path, u"-config_path", self.__server_dir_cfg, u"-modstorage", self.__server_dir_mod,
                  u"-logdir", self.__server_dir_log]
 
         self.__param = param + map(lambda st: st.decode('utf-8'), shlex.split(
-            ConfigManager.get_config('server_config_extra_parameter').encode('utf-8')))
-
-        self.__pid = -1
-        self.__process = None
-        self.__ps = None
-        self.__ps_cmdline = None
-        self.__ps_create_time = 0.0
+            cfg.server_config_extra_parameter.encode('utf-8')))
+
+    def defer_launch_config(self, cfg):
+        # The new launch config will be used from the next (re)start, the running server isn't affected.
+        err = self.__check_launch_config(cfg)
+        if err is not None:
+            Logger.warn(err)
+            Logger.warn(u"The new launch config is ignored, keep using the current one.")
+            self.__pending_launch_config = None
+        else:
+            Logger.info(u"The new launch config will take effect at the next server restart.")
+            self.__pending_launch_config = cfg
 
     def get_server_abs_root(self):
         return self.__server_root
@@ -335,11 +946,285 @@ class ServerProcessHandler:
     def get_server_abs_log_dir(self):
         return self.__server_dir_log
 
-    def restart_server(self):
-        self.stop_server()
+    def get_helper_mod_record_path(self):
+        return self.__server_dir_cfg + u"/server_modding_ping.txt"
+
+    def read_helper_mod_record(self):
+        # The first line of the helper mod's output is its heartbeat, raises IOError if it can't be read.
+        with open(self.get_helper_mod_record_path(), 'r') as f:
+            return f.readline().rstrip()
+
+    def finish_archive_coalescing(self):
+        # The watchdog is exiting. If the server was kept down in a crash loop, the history of its last run goes into
+        # the held archive as well, instead of being archived on its own by the next watchdog.
+        if self.__held_archive_dir is not None and not self.is_running():
+            self.__archive_log_and_dmp()
+            self.__save_end_reason()
+        self.set_archive_coalescing(False)
+
+    def set_archive_coalescing(self, is_coalescing):
+        # While coalescing, the running history of every start goes into the same archive, which only gets zipped
+        # once the coalescing ends. A crash loop then produces a single archive instead of hundreds.
+        if is_coalescing == self.__is_archive_coalescing:
+            return
+        self.__is_archive_coalescing = is_coalescing
+        if not is_coalescing and self.__held_archive_dir is not None:
+            ASyncZipper.request_zip(self.__held_archive_dir, u"%s.zip" % self.__held_archive_dir, True,
+                                    u",".join(self.__held_archive_reasons))
+            self.__held_archive_dir = None
+            self.__held_archive_reasons = []
+
+    def restart_server(self, reason=None):
+        # The files are read while the server is shutting down. A pending launch config may change them, they're
+        # read along with the launch then.
+        if self.__pending_launch_config is None and self.is_running():
+            self.__start_page_cache_warmer()
+        self.stop_server(reason)
         self.start_server()
 
+    def __start_page_cache_warmer(self):
+        if self.__page_cache_warmer is not None or not ConfigManager.get_config('prewarm_page_cache'):
+            return
+        self.__page_cache_warmer = PageCacheWarmer(self.__get_prewarm_files,
+                                                   ConfigManager.get_config('prewarm_byte_budget'),
+                                                   ConfigManager.get_config('prewarm_readers'))
+        self.__page_cache_warmer.start()
+
+    def __wait_page_cache_warmer(self):
+        warmer = self.__page_cache_warmer
+        if warmer is None:
+            return
+        self.__page_cache_warmer = None
+        is_done = warmer.wait(ConfigManager.get_config('prewarm_max_wait'))
+        warmer.cancel()
+        ServerProcessHandler.__log_page_cache_warmer(warmer, is_done)
+
+    def __end_background_page_cache_warmer(self, is_stopping):
+        # The warmer started along with the launch is reported once it's done, or cut short when the server it reads
+        # for is stopped.
+        warmer = self.__background_page_cache_warmer
+        if warmer is None:
+            return
+        is_done = warmer.wait(0)
+        if not is_done and not is_stopping:
+            return
+        self.__background_page_cache_warmer = None
+        warmer.cancel()
+        ServerProcessHandler.__log_page_cache_warmer(warmer, is_done)
+
+    @staticmethod
+    def __log_page_cache_warmer(warmer, is_done):
+        planned_files, planned_bytes, read_bytes, seconds = warmer.get_stats()
+        Logger.info(u"Page cache pre-warm: %.1f MB of %d file(s) read in %.2fs%s" % (
+            read_bytes / 1048576.0, planned_files, seconds,
+            u"" if is_done else u", the remaining %.1f MB are skipped" % ((planned_bytes - read_bytes) / 1048576.0)))
+
+    def __get_prewarm_files(self):
+        # The files recorded during the last startup come first, they're the most accurate.
+        files = []
+        try:
+            with open(ConfigManager.get_config('prewarm_record_file')) as f:
+                files.extend(json.load(f, encoding='utf-8'))
+        except IOError:
+            pass
+        except ValueError:
+            Logger.warn(u"Page cache pre-warm: the record file is corrupted, ignoring it")
+
+        map_names = []
+        mod_ids = []
+        for i in range(len(self.__param) - 1):
+            if self.__param[i] == u"-map":
+                map_names.append(self.__param[i + 1])
+            elif self.__param[i] == u"-mods":
+                mod_ids.extend(self.__param[i + 1].lower().split())
+        for name in map_names:
+            files.append(os.path.join(self.get_server_abs_root(), u"ns2", u"maps", name + u".level"))
+        try:
+            mod_dirs = [i for i in os.listdir(self.__server_dir_mod) if any(mod_id in i.lower() for mod_id in mod_ids)]
+        except OSError:
+            mod_dirs = []
+        for mod_dir in sorted(mod_dirs):
+            for root, dirs, names in os.walk(os.path.join(self.__server_dir_mod, mod_dir)):
+                dirs.sort()
+                files.extend(os.path.join(root, name) for name in sorted(names))
+
+        seen = set()
+        return [i for i in files if not (i in seen or seen.add(i))]
+
+    def track_opened_files(self):
+        """Record the map and mod files the server opens until the helper mod comes online, for the next pre-warm.
+
+        Also reports the pre-warm started along with the launch once it's done.
+        """
+        self.__end_background_page_cache_warmer(False)
+        if self.__opened_files is None or not self.is_running():
+            return
+        try:
+            opened_files = self.__ps.open_files()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return
+        for f in opened_files:
+            path = f.path if isinstance(f.path, unicode) else f.path.decode('utf-8', 'replace')
+            if self.__is_prewarm_candidate(path):
+                self.__opened_files.add(path)
+
+        try:
+            is_helper_mod_online = os.path.getmtime(self.get_helper_mod_record_path()) > self.__launch_time
+        except OSError:
+            is_helper_mod_online = False
+        if not is_helper_mod_online:
+            return
+        opened_files = self.__opened_files
+        self.__opened_files = None
+        if not opened_files:
+            # nothing caught, the previous record is kept
+            return
+        path = ConfigManager.get_config('prewarm_record_file')
+        try:
+            with open(path, 'w') as f:
+                json.dump(sorted(opened_files), f, indent=4)
+        except IOError as ex:
+            Logger.warn(u"Fail to save the files opened by the server to '%s' (%s)" % (path, ex))
+        else:
+            Logger.verbose(u"Page cache pre-warm: recorded %d file(s) opened by the server" % len(opened_files))
+
+    def __is_prewarm_candidate(self, path):
+        # the game and mod files, not what the server writes
+        for excluded_dir in (self.__server_dir_log, self.__server_dir_cfg):
+            if path.startswith(excluded_dir + os.sep):
+                return False
+        for root in (self.get_server_abs_root(), self.__server_dir_mod):
+            if path.startswith(root + os.sep):
+                return True
+        return False
+
+    def adopt_server(self):
+        """Take over the server left running by a previous watchdog, return True if there is one.
+
+        The pid from the state file is checked against the process's creation time, otherwise the processes are
+        scanned once. Either way the server must use the dirs of the current config, since they are the ones being
+        monitored. Nothing is done to the server or to its running log dir.
+        """
+        PREFIX_STRING = u"Server adoption: "
+        state = self.__load_state()
+        process = None
+        if state is not None:
+            process = self.__find_process_by_state(state)
+        if process is None:
+            process = self.__find_process_by_scan()
+        if process is None:
+            Logger.verbose(PREFIX_STRING + u"no running server to adopt")
+            return False
+
+        try:
+            self.__ps_create_time = process.create_time()
+            cmdline = ServerProcessHandler.__get_cmdline(process)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            Logger.verbose(PREFIX_STRING + u"the server (pid %d) went away" % process.pid)
+            return False
+        self.__pid = process.pid
+        self.__process = None
+        self.__ps = process
+        self.__ps_cmdline = u" ".join(cmdline)
+        # the adopted run is still going, the end reason of the previous one doesn't apply
+        self.__end_reason = None
+        self.__save_state(cmdline)
+        Logger.info(PREFIX_STRING + u"adopted the running server (pid %d, started at %s)" % (
+            self.__pid, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.__ps_create_time))))
+        if cmdline[max(len(cmdline) - len(self.__param) + 1, 0):] != self.__param[1:]:
+            Logger.info(PREFIX_STRING + u"its launch parameters differ from the config, the config will be used from "
+                                        u"the next restart")
+        return True
+
+    def __find_process_by_state(self, state):
+        try:
+            if state['log_dir'] != self.__server_dir_log:
+                return None
+            process = psutil.Process(state['pid'])
+            if abs(process.create_time() - state['create_time']) > 0.01:
+                # the pid has been reused
+                return None
+            if not self.__is_monitorable(ServerProcessHandler.__get_cmdline(process)):
+                return None
+        except (psutil.NoSuchProcess, psutil.AccessDenied, KeyError, TypeError):
+            return None
+        return process
+
+    def __find_process_by_scan(self):
+        candidates = []
+        for process in psutil.process_iter(attrs=['cmdline', 'create_time']):
+            cmdline = process.info['cmdline']
+            if not cmdline or process.info['create_time'] is None:
+                continue
+            if self.__is_monitorable([i if isinstance(i, unicode) else i.decode('utf-8', 'replace') for i in cmdline]):
+                candidates.append(process)
+        if len(candidates) > 1:
+            Logger.warn(u"Server adoption: %d servers use the same dirs (pid %s), adopting the oldest one" % (
+                len(candidates), u", ".join(str(p.pid) for p in candidates)))
+        return min(candidates, key=lambda p: p.info['create_time']) if candidates else None
+
+    def __is_monitorable(self, cmdline):
+        # The server must have been given the config, mod storage and log dirs of the current config, they identify
+        # the instance. The executable isn't compared, the server may run through a wrapper.
+        dir_params = self.__param[1:7]
+        for i in range(len(cmdline) - len(dir_params) + 1):
+            if cmdline[i:i + len(dir_params)] == dir_params:
+                return True
+        return False
+
+    @staticmethod
+    def __get_cmdline(process):
+        return [i if isinstance(i, unicode) else i.decode('utf-8', 'replace') for i in process.cmdline()]
+
+    def __load_state(self):
+        try:
+            with open(ConfigManager.get_config('adopt_state_file')) as f:
+                return json.load(f, encoding='utf-8')
+        except IOError:
+            return None
+        except ValueError:
+            Logger.warn(u"Server adoption: the state file is corrupted, ignoring it")
+            return None
+
+    def __save_state(self, cmdline):
+        state = {
+            'pid': self.__pid,
+            'create_time': self.__ps_create_time,
+            'cmdline': cmdline,
+            'log_dir': self.__server_dir_log,
+        }
+        path = ConfigManager.get_config('adopt_state_file')
+        try:
+            with open(path, 'w') as f:
+                json.dump(state, f, indent=4, sort_keys=True)
+        except IOError as ex:
+            Logger.warn(u"Fail to save the server's state to '%s' (%s)" % (path, ex))
+
+    def __save_end_reason(self):
+        # Once the server is stopped, only why it was stopped is left in the state file, nothing to adopt.
+        path = ConfigManager.get_config('adopt_state_file')
+        try:
+            with open(path, 'w') as f:
+                json.dump({'end_reason': self.__end_reason}, f, indent=4, sort_keys=True)
+        except IOError as ex:
+            Logger.warn(u"Fail to save the server's state to '%s' (%s)" % (path, ex))
+
     def start_server(self):
+        if not self.is_running():
+            # first, so the helper mod's record and the pre-warm go to the new dirs and files
+            if self.__pending_launch_config is not None:
+                self.__apply_launch_config(self.__pending_launch_config)
+                self.__pending_launch_config = None
+                Logger.info(u"New launch config applied.")
+            if self.__page_cache_warmer is not None:
+                # Started by restart_server, the shutdown of the previous server is over. Waited for before the helper
+                # mod's record gets pushed forward, so the wait doesn't eat into the startup tolerance.
+                self.__wait_page_cache_warmer()
+            else:
+                # nothing to overlap, the server is launched right away and the files are read along with it
+                self.__start_page_cache_warmer()
+                self.__background_page_cache_warmer = self.__page_cache_warmer
+                self.__page_cache_warmer = None
         self.__force_update_helper_mod_record()
         if not self.is_running():
             self.__archive_log_and_dmp()
@@ -363,7 +1248,7 @@ class ServerProcessHandler:
                     if cmp(platform.system(), 'Windows') is 0:
                         # Start server under the Windows
                         startupinfo = None
-                        if ConfigManager.get_config('win_os_hide_server_window'):
+                        if self.__is_hide_server_window:
                             startupinfo = STARTUPINFO()
                             startupinfo.dwFlags |= STARTF_USESHOWWINDOW
 
@@ -375,8 +1260,10 @@ class ServerProcessHandler:
                                                )
                     else:
                         # Start server under the Linux
+                        # "exec" makes the shell replace itself with the server, otherwise shells like dash keep
+                        # running as the parent and the watchdog would be monitoring (and terminating) the shell.
                         self.__process = Popen(
-                            args=cmdline.encode('utf-8'),
+                            args=(u"exec " + cmdline).encode('utf-8'),
                             shell=True,
                             close_fds=True,
                             stdin=DEVNULL,
@@ -388,6 +1275,8 @@ class ServerProcessHandler:
                 self.__ps = psutil.Process(pid=self.__pid)
                 self.__ps_create_time = self.__ps.create_time()
                 self.__ps_cmdline = cmdline
+                self.__launch_time = time.time()
+                self.__opened_files = set() if ConfigManager.get_config('prewarm_page_cache') else None
                 # self.__ps_cmdline = u""
                 # for i in self.__ps.cmdline():
                 #     if type(i) is str:
@@ -407,9 +1296,18 @@ class ServerProcessHandler:
                 Logger.info(u"Server is running, pid=%d" % self.__pid)
 
             os.chdir(prev_dir)
-
-    def stop_server(self):
-        if self.is_running():
+            if self.__ps is not None:
+                self.__save_state(self.__param)
+
+    def stop_server(self, reason=None):
+        # The first reason given since the last start is kept, a later stop (e.g. the watchdog exiting during a crash
+        # loop hold) must not relabel the run that already ended.
+        self.__end_background_page_cache_warmer(True)
+        is_reason_set = reason is not None and self.__end_reason is None
+        if is_reason_set:
+            self.__end_reason = reason
+        is_running = self.is_running()
+        if is_running:
             try:
                 Logger.info(u"Try to stop server process (pid %d) by terminate()" % self.__pid)
                 self.__ps.terminate()
@@ -436,11 +1334,14 @@ class ServerProcessHandler:
             self.__process = None
             self.__ps = None
             self.__ps_cmdline = None
+        if is_reason_set or is_running:
+            self.__save_end_reason()
 
     def is_running(self):
         try:
+            # an adopted server isn't a child process
             if (self.__pid is not -1) and \
-                    (self.__process.poll() is None) and \
+                    (self.__process is None or self.__process.poll() is None) and \
                     (self.__ps.is_running()):
                 return True
         except psutil.NoSuchProcess:
@@ -450,7 +1351,7 @@ class ServerProcessHandler:
     def get_info(self):
         if self.is_running():
             try:
-                vms = self.__ps.memory_info().vms
+                mem = self.__ps.memory_info()
 
             except psutil.NoSuchProcess:
                 return None
@@ -459,7 +1360,8 @@ class ServerProcessHandler:
             else:
                 return {
                     'pid': self.__pid,
-                    'vms': vms,
+                    'vms': mem.vms,
+                    'rss': mem.rss,
                     'create_time': self.__ps_create_time,
                 }
 
@@ -484,10 +1386,15 @@ class ServerProcessHandler:
 
         time_label = time.strftime('%Y-%m-%d_%H-%M-%S', time.localtime(time.time()))
 
-        new_archive_dir = self.__server_dir_log_backup + u"/" + time_label
+        if self.__held_archive_dir is not None:
+            # coalescing, every start gets a sub folder of the held archive
+            archive_root = self.__held_archive_dir
+        else:
+            archive_root = self.__server_dir_log_backup
+        new_archive_dir = archive_root + u"/" + time_label
         i = 1
         while os.path.exists(new_archive_dir):
-            new_archive_dir = self.__server_dir_log_backup + u"/" + time_label + u"_(%d)" % i
+            new_archive_dir = archive_root + u"/" + time_label + u"_(%d)" % i
             i = i + 1
         try:
             os.mkdir(new_archive_dir)
@@ -501,8 +1408,6 @@ class ServerProcessHandler:
             while retry_flag:
                 Logger.verbose(u"Trying to archive previous process's running history from '%s' to '%s'..." % (
                     self.__server_dir_log, new_archive_dir))
-                if ExitFlag:
-                    Logger.fatal(u"Script get terminated while trying to archive the server's running log.")
                 try:
                     log_dir_files = os.listdir(self.__server_dir_log)
                 except Exception:
@@ -521,6 +1426,9 @@ class ServerProcessHandler:
                                     os.remove(dist_full_path)
                             shutil.move(file_full_path, dist_full_path)
                     except Exception as ex:
+                        # only the retries are given up on exit, the watchdog archives the last run when it exits
+                        if ExitFlag:
+                            Logger.fatal(u"Script get terminated while trying to archive the server's running log.")
                         Logger.warn(
                             u"Archive failed. (Maybe the bug collector or previous server process is still running?)")
                         Logger.warn(u"Retry archiving after %d seconds." % retry_wait_sec)
@@ -531,45 +1439,697 @@ class ServerProcessHandler:
                     else:
                         retry_flag = False
             Logger.verbose(u"Previous process's running history has archived to '%s'." % new_archive_dir)
-            ASyncZipper.request_zip(new_archive_dir, u"%s.zip" % new_archive_dir, True)
+            end_reason = self.__end_reason
+            self.__end_reason = None
+            if self.__is_archive_coalescing:
+                if self.__held_archive_dir is None:
+                    self.__held_archive_dir = new_archive_dir
+                if end_reason is not None and end_reason not in self.__held_archive_reasons:
+                    self.__held_archive_reasons.append(end_reason)
+            else:
+                ASyncZipper.request_zip(new_archive_dir, u"%s.zip" % new_archive_dir, True, end_reason)
+
+
+class ServerMetricsCollector:
+    METRIC_NAMES = ('tick_rate', 'entities', 'players')
+
+    def __init__(self, server, clock):
+        self.__server = server
+        self.__clock = clock
+        self.__series = {}
+        self.__history_size = 0
+        self.apply_config(ConfigManager.get_snapshot())
+        self.reset()
+
+    def apply_config(self, cfg):
+        self.__is_enabled = cfg.perf_metrics_collect
+        self.__log_file_pattern = cfg.perf_metrics_log_file_pattern
+        self.__log_patterns = []
+        for name, pattern in cfg.perf_metrics_log_patterns:
+            if name not in ServerMetricsCollector.METRIC_NAMES:
+                Logger.warn(u"Performance metrics: ignored pattern of unknown metric '%s'" % name)
+                continue
+            self.__log_patterns.append((name, re.compile(pattern)))
+        self.__apply_history_size(cfg.perf_metrics_history_size)
+
+    def __apply_history_size(self, history_size):
+        if history_size == self.__history_size:
+            return
+        self.__history_size = history_size
+        for name in ServerMetricsCollector.METRIC_NAMES:
+            self.__series[name] = TimeSeries(max(history_size, 1))
 
+    def reset(self):
+        # The running log dir gets archived before each (re)start, so the previous run's samples are dropped as well.
+        self.__abspath_helper_mod_output = self.__server.get_server_abs_cfg_dir() + u"/server_modding_ping.txt"
+        self.__log_tailer = LogTailer(self.__server.get_server_abs_log_dir(), self.__log_file_pattern)
+        self.__helper_mod_output_mtime = None
+        for s in self.__series.values():
+            s.clear()
+
+    def get_series(self, name):
+        return self.__series[name]
+
+    def get_latest(self, name):
+        latest = self.__series[name].latest()
+        if latest is None:
+            return None
+        return latest[1]
+
+    def poll(self):
+        if not self.__is_enabled:
+            return
+        now = self.__clock.time()
+        for file_name, line in self.__log_tailer.poll():
+            for name, pattern in self.__log_patterns:
+                m = pattern.search(line)
+                if m is not None:
+                    self.add_sample(now, name, m.group(1))
+        self.__poll_helper_mod_output(now)
+
+    def __poll_helper_mod_output(self, now):
+        # The first line is the helper mod's heartbeat, the optional following lines are "name=value" pairs.
+        # The file is tiny and gets rewritten in place, so it's only read again when its mtime changes.
+        try:
+            mtime = os.path.getmtime(self.__abspath_helper_mod_output)
+            if mtime == self.__helper_mod_output_mtime:
+                return
+            self.__helper_mod_output_mtime = mtime
+            with open(self.__abspath_helper_mod_output, 'r') as f:
+                lines = f.readlines()[1:]
+        except (IOError, OSError):
+            return
+        for line in lines:
+            name, sep, value = line.partition('=')
+            name = name.strip()
+            if sep and name in self.__series:
+                self.add_sample(now, name, value.strip())
 
-class ServerWatchDog:
-    def __init__(self):
-        self.__server = ServerProcessHandler()
-        self.__monitor_interval = ConfigManager.get_config('monitor_interval')
-        self.__is_daily_restart_server = ConfigManager.get_config('daily_restart')
-        self.__daily_restart_time_hms = ConfigManager.get_config('daily_restart_h_m_s')
-        self.__daily_restart_vms_threshold = ConfigManager.get_config('daily_restart_vms_threshold')
-        self.__next_daily_restart_trigger_time = self.__calc_next_daily_restart_trigger_timestamp()
-
-        self.__is_lua_engine_check_status = ConfigManager.get_config('lua_engine_check_status')
+    def add_sample(self, now, name, str_value):
+        try:
+            value = float(str_value)
+        except ValueError:
+            Logger.debug(u"Performance metrics: fail to parse the value '%s' of metric '%s'" % (str_value, name))
+        else:
+            self.__series[name].append(now, value)
+
+
+class ModDownloadMonitor:
+    def __init__(self, server, clock):
+        self.__server = server
+        self.__clock = clock
+        self.apply_config(ConfigManager.get_snapshot())
+        self.__abspath_helper_mod_output = None
+        self.__mod_dir_tracker = None
+
+        self.__is_in_startup = False
+        self.__startup_time = 0.0
+        self.__last_poll_time = 0.0
+        self.__last_total_size = 0
+        self.__last_growth_time = None
+        self.__downloaded_size = 0
+        self.__throughput = 0.0
+
+    def apply_config(self, cfg):
+        self.__is_enabled = cfg.mod_download_stall_check
+        self.__stall_threshold = cfg.mod_download_stall_threshold
+
+    def get_throughput(self):
+        return self.__throughput
+
+    def begin_startup(self):
+        # Called right after the server process get spawned, the helper mod's record has just been force updated.
+        if not self.__is_enabled:
+            self.__is_in_startup = False
+            return
         self.__abspath_helper_mod_output = self.__server.get_server_abs_cfg_dir() + u"/server_modding_ping.txt"
-        self.__lua_engine_no_response_threshold = ConfigManager.get_config('lua_engine_no_response_threshold')
-        self.__helper_mod_record_pattern = ConfigManager.get_config("lua_engine_helper_mod_record_format")
+        self.__mod_dir_tracker = DirSizeTracker(self.__server.get_server_abs_mod_dir())
+        self.__is_in_startup = True
+        self.__startup_time = self.__clock.time()
+        self.__last_poll_time = self.__startup_time
+        self.__last_total_size = self.__mod_dir_tracker.rescan()
+        self.__last_growth_time = None
+        self.__downloaded_size = 0
+        self.__throughput = 0.0
+
+    def is_stalled(self):
+        if not self.__is_in_startup:
+            return False
+
+        PREFIX_STRING = u"Mod download monitor: "
+        now = self.__clock.time()
+        if self.__is_helper_mod_online():
+            self.__is_in_startup = False
+            self.__throughput = 0.0
+            Logger.verbose(PREFIX_STRING + u"server started after %ds, %d byte(s) of mod downloaded" % (
+                now - self.__startup_time, self.__downloaded_size))
+            return False
+
+        total_size = self.__mod_dir_tracker.poll()
+        grown_size = total_size - self.__last_total_size
+        elapsed = now - self.__last_poll_time
+        if grown_size > 0:
+            self.__downloaded_size = self.__downloaded_size + grown_size
+            self.__last_growth_time = now
+        if elapsed > 0:
+            self.__throughput = max(grown_size, 0) / elapsed
+        self.__last_total_size = total_size
+        self.__last_poll_time = now
+
+        if self.__last_growth_time is None:
+            # Nothing is being downloaded (yet), leave it to the lua engine check.
+            return False
+
+        stalled_time = now - self.__last_growth_time
+        if stalled_time >= self.__stall_threshold:
+            Logger.info(
+                PREFIX_STRING +
+                (u"no progress for %ds after %d byte(s) downloaded, the server will be restarted" % (
+                    stalled_time, self.__downloaded_size)))
+            self.__is_in_startup = False
+            return True
+        Logger.debug(PREFIX_STRING + u"%d byte(s) downloaded, %.1f KB/s, no progress for %ds" % (
+            self.__downloaded_size, self.__throughput / 1024, stalled_time))
+        return False
+
+    def __is_helper_mod_online(self):
+        # The helper mod only starts writing its record once the mods are loaded and the lua engine is running.
+        try:
+            return os.path.getmtime(self.__abspath_helper_mod_output) > self.__startup_time
+        except OSError:
+            return False
+
+
+class CrashLoopGuard:
+    """Back off and eventually stop restarting a server that keeps dying, it's a circuit breaker over the restarts.
+
+    The unplanned restarts are counted in a sliding window. From the 2nd one, the server is kept down for an
+    exponentially growing, jittered delay before it gets started again. Once the window holds too many of them, the
+    breaker opens: the server stays down and an alert is raised. After the cooldown the breaker is half open, the
+    server gets one more try and the breaker closes again if it survives for a whole window.
+    """
+
+    UNPLANNED_REASONS = frozenset([u"process_missing", u"mod_download_stall", u"lua_engine_dead"])
+
+    STATE_CLOSED = u"closed"
+    STATE_OPEN = u"open"
+    STATE_HALF_OPEN = u"half_open"
+
+    def __init__(self, clock):
+        self.__clock = clock
+        self.__restart_times = deque()
+        self.__state = CrashLoopGuard.STATE_CLOSED
+        self.__half_open_time = 0.0
+        # the server is kept down until then, None if it isn't
+        self.__hold_until = None
+        self.apply_config(ConfigManager.get_snapshot())
+
+    def apply_config(self, cfg):
+        self.__is_enabled = cfg.crash_loop_protection
+        self.__window = cfg.crash_loop_window
+        self.__backoff_base = cfg.crash_loop_backoff_base
+        self.__backoff_max = cfg.crash_loop_backoff_max
+        self.__breaker_threshold = cfg.crash_loop_breaker_threshold
+        self.__breaker_cooldown = cfg.crash_loop_breaker_cooldown
+        self.__alert_command = cfg.crash_loop_alert_command
+        if not self.__is_enabled:
+            self.__reset()
+
+    def __reset(self):
+        # Disabled, e.g. by a config reload: forget the restarts and let a held server start at the next check.
+        if self.__hold_until is not None:
+            Logger.info(u"Crash loop guard: disabled, the server will be started again.")
+            self.__hold_until = self.__clock.time()
+        self.__restart_times.clear()
+        self.__state = CrashLoopGuard.STATE_CLOSED
+        WatchdogMetrics.crash_loop_restarts.set(0)
+        WatchdogMetrics.crash_loop_breaker_open.set(0)
+
+    def is_holding(self):
+        return self.__hold_until is not None
+
+    def get_state(self):
+        # the breaker's state, or u"backoff" while the breaker is closed but the server is kept down
+        if self.__state == CrashLoopGuard.STATE_CLOSED and self.__hold_until is not None:
+            return u"backoff"
+        return self.__state
+
+    def is_in_crash_loop(self):
+        # A single unplanned restart is an ordinary crash, a loop takes at least 2 of them in the window.
+        self.__update_window()
+        return self.__hold_until is not None or self.__state != CrashLoopGuard.STATE_CLOSED or \
+            len(self.__restart_times) >= 2
+
+    def __update_window(self):
+        now = self.__clock.time()
+        while self.__restart_times and self.__restart_times[0] <= now - self.__window:
+            self.__restart_times.popleft()
+        WatchdogMetrics.crash_loop_restarts.set(len(self.__restart_times))
+        if self.__state == CrashLoopGuard.STATE_HALF_OPEN and now - self.__half_open_time >= self.__window:
+            Logger.info(u"Crash loop guard: the server survived the trial start, restarts are back to normal.")
+            self.__state = CrashLoopGuard.STATE_CLOSED
+
+    def is_hold_over(self):
+        # Return True once the server is allowed to start again.
+        now = self.__clock.time()
+        if now < self.__hold_until:
+            WatchdogMetrics.crash_loop_hold_seconds.set(self.__hold_until - now)
+            return False
+        self.__hold_until = None
+        WatchdogMetrics.crash_loop_hold_seconds.set(0)
+        if self.__state == CrashLoopGuard.STATE_OPEN:
+            Logger.info(u"Crash loop guard: cooldown is over, giving the server one more try.")
+            self.__state = CrashLoopGuard.STATE_HALF_OPEN
+            self.__half_open_time = now
+            WatchdogMetrics.crash_loop_breaker_open.set(0)
+        return True
+
+    def record_restart(self, reason):
+        # Called before restarting the server, is_holding() tells whether it should be kept down for now.
+        if not self.__is_enabled or reason not in CrashLoopGuard.UNPLANNED_REASONS:
+            return
+        PREFIX_STRING = u"Crash loop guard: "
+        now = self.__clock.time()
+        self.__restart_times.append(now)
+        count = len(self.__restart_times)
+        WatchdogMetrics.crash_loop_restarts.set(count)
+
+        if self.__state == CrashLoopGuard.STATE_HALF_OPEN or (0 < self.__breaker_threshold <= count):
+            self.__state = CrashLoopGuard.STATE_OPEN
+            self.__hold_until = now + self.__breaker_cooldown if self.__breaker_cooldown > 0 else float('inf')
+            WatchdogMetrics.crash_loop_breaker_open.set(1)
+            WatchdogMetrics.crash_loop_breaker_trips.inc()
+            if self.__breaker_cooldown > 0:
+                retry_st = u"it will be given one more try in %ds" % self.__breaker_cooldown
+            else:
+                retry_st = u"restart the watchdog to start it again"
+            self.__alert(PREFIX_STRING + u"%d unplanned restart(s) in %ds (last: %s), the server is stopped, %s." % (
+                count, self.__window, reason, retry_st))
+            return
+
+        if count < 2:
+            return
+        delay = min(self.__backoff_base * 2 ** (count - 2), self.__backoff_max)
+        # equal jitter, so the instances of a host hit by the same problem don't restart in lockstep
+        delay = delay / 2.0 + random.uniform(0, delay / 2.0)
+        self.__hold_until = now + delay
+        WatchdogMetrics.crash_loop_hold_seconds.set(delay)
+        Logger.warn(PREFIX_STRING + u"%d unplanned restart(s) in %ds (last: %s), the server will be started in %ds." % (
+            count, self.__window, reason, delay))
+
+    def __alert(self, message):
+        Logger.warn(message)
+        if not self.__alert_command:
+            return
+        env = dict(os.environ)
+        env['NS2WDT_ALERT'] = message.encode('utf-8')
+        try:
+            Popen(self.__alert_command.encode('utf-8'), shell=True, close_fds=True, env=env)
+        except OSError as ex:
+            Logger.warn(u"Crash loop guard: fail to run the alert command (%s)" % ex)
+
+
+class CpuPlacementManager:
+    """Keep the server on its own CPUs at its own priority, and the watchdog out of its way.
+
+    The placement is applied right after the server starts and checked again periodically, so a change made by
+    something else gets reverted. The watchdog gets the CPUs the server doesn't use. On Linux the affinity and the
+    nice value belong to each thread, so they are applied to every thread of the server and to the watchdog's
+    worker threads (compression, metrics exporter, pre-warm). The watchdog's main thread is left alone: it spawns the
+    server, which would inherit its placement and could need privileges to get its own priority back.
+    """
+
+    __IS_WINDOWS = cmp(platform.system(), 'Windows') is 0
+
+    def __init__(self, server, clock):
+        self.__server = server
+        self.__clock = clock
+        self.__placement = None
+        self.__next_check_time = 0.0
+        # (name, pid) the placement was denied for, only reported once per placement
+        self.__denied = set()
+        self.apply_config(ConfigManager.get_snapshot())
+
+    def apply_config(self, cfg):
+        self.__check_interval = cfg.cpu_placement_check_interval
+        placement = (cfg.cpu_affinity_server, cfg.cpu_nice_server, cfg.cpu_nice_watchdog) \
+            if cfg.cpu_placement else None
+        if placement == self.__placement:
+            return
+        self.__placement = placement
+        self.__denied = set()
+        if placement is None:
+            return
+        server_cpus, server_nice, watchdog_nice = placement
+        is_affinity_supported = hasattr(psutil.Process, 'cpu_affinity')
+        if server_cpus and not is_affinity_supported:
+            Logger.warn(u"CPU placement: the CPU affinity is not supported on this OS, only the priority is managed.")
+        self.__server_cpus = sorted(server_cpus) if is_affinity_supported else []
+        self.__watchdog_cpus = [i for i in range(psutil.cpu_count()) if i not in self.__server_cpus] \
+            if self.__server_cpus else []
+        self.__server_nice = server_nice
+        self.__watchdog_nice = watchdog_nice
+        # (re)apply at the next check
+        self.__next_check_time = 0.0
+
+    def on_server_started(self):
+        if self.__placement is not None:
+            self.__place_server(is_check=False)
+
+    def check(self):
+        if self.__placement is None:
+            return
+        now = self.__clock.time()
+        if now < self.__next_check_time:
+            return
+        is_first_check = self.__next_check_time == 0.0
+        self.__next_check_time = now + self.__check_interval if self.__check_interval > 0 else float('inf')
+        if not CpuPlacementManager.__IS_WINDOWS:
+            # on Windows the priority and the affinity belong to the whole process, the server would inherit them
+            self.__place(u"watchdog", os.getpid(), self.__watchdog_cpus, self.__watchdog_nice, not is_first_check)
+        self.__place_server(not is_first_check)
+
+    def __place_server(self, is_check):
+        process_info = self.__server.get_info()
+        if process_info is not None:
+            self.__place(u"server", process_info['pid'], self.__server_cpus, self.__server_nice, is_check)
+
+    def __place(self, name, pid, cpus, nice, is_check):
+        PREFIX_STRING = u"CPU placement: "
+        priority = CpuPlacementManager.__nice_to_priority(nice)
+        changed_threads = 0
+        try:
+            process = psutil.Process(pid)
+            if CpuPlacementManager.__IS_WINDOWS:
+                targets = [process]
+            elif pid == os.getpid():
+                # the main thread's id is the pid, it's the one spawning the server
+                targets = [psutil.Process(t.id) for t in process.threads() if t.id != pid]
+            else:
+                targets = [psutil.Process(t.id) for t in process.threads()]
+        except psutil.NoSuchProcess:
+            return
+        except psutil.AccessDenied:
+            self.__warn_denied(name, pid, u"access denied when listing the threads of the %s (pid %d)" % (name, pid))
+            return
+
+        for target in targets:
+            try:
+                is_changed = False
+                if cpus and sorted(target.cpu_affinity()) != cpus:
+                    target.cpu_affinity(cpus)
+                    is_changed = True
+                if target.nice() != priority:
+                    target.nice(priority)
+                    is_changed = True
+            except psutil.NoSuchProcess:
+                # the thread is gone
+                continue
+            except psutil.AccessDenied:
+                self.__warn_denied(name, pid, u"access denied when placing the %s (pid %d) on CPUs %s with nice %d" % (
+                    name, pid, cpus or u"(any)", nice))
+                return
+            if is_changed:
+                changed_threads = changed_threads + 1
+
+        if changed_threads == 0:
+            return
+        message = u"%s (pid %d) placed on CPUs %s with nice %d (%d thread(s))" % (
+            name, pid, cpus or u"(any)", nice, changed_threads)
+        if is_check:
+            Logger.warn(PREFIX_STRING + u"the placement was changed by something else, " + message)
+        else:
+            Logger.info(PREFIX_STRING + message)
+
+    def __warn_denied(self, name, pid, message):
+        if (name, pid) in self.__denied:
+            return
+        self.__denied.add((name, pid))
+        Logger.warn(u"CPU placement: " + message)
+
+    @staticmethod
+    def __nice_to_priority(nice):
+        if not CpuPlacementManager.__IS_WINDOWS:
+            return nice
+        # the realtime class is never used, it could starve the OS
+        if nice <= -15:
+            return psutil.HIGH_PRIORITY_CLASS
+        if nice < 0:
+            return psutil.ABOVE_NORMAL_PRIORITY_CLASS
+        if nice == 0:
+            return psutil.NORMAL_PRIORITY_CLASS
+        if nice < 15:
+            return psutil.BELOW_NORMAL_PRIORITY_CLASS
+        return psutil.IDLE_PRIORITY_CLASS
+
+
+class ServerWatchDog:
+    def __init__(self, server=None, clock=None):
+        # Both can be replaced by a simulated server and a virtual clock, see NS2_Restart_Simulator.py
+        self.__clock = SystemClock() if clock is None else clock
+        # The timing histograms measure the watchdog itself with the real clock, a simulation skips them.
+        self.__is_self_timed = isinstance(self.__clock, SystemClock)
+        self.__server = ServerProcessHandler() if server is None else server
         self.__helper_mod_output_invalid_cnt = 0
+        self.__metrics = ServerMetricsCollector(self.__server, self.__clock)
+        self.__mod_download_monitor = ModDownloadMonitor(self.__server, self.__clock)
+        self.__crash_loop_guard = CrashLoopGuard(self.__clock)
+        self.__cpu_placement = CpuPlacementManager(self.__server, self.__clock)
+        self.__daily_restart_time_hms = None
+        self.__start_time = self.__clock.time()
+        self.__heartbeat_time = None
+        self.__is_player_count_unknown_warned = False
+        self.__restart_count = 0
+        self.__last_restart_reason = u""
+        self.__last_restart_time = 0.0
+        self.__status_page = None
+        self.__apply_config(ConfigManager.get_snapshot())
+
+        # The checks run in this order until one of them asks for a restart, the name is the restart reason.
+        self.__restart_checks = [
+            (u"process_missing", self.__is_server_process_missing),
+            (u"daily_restart", self.__is_need_daily_restart),
+            (u"perf_restart", self.__is_need_perf_restart),
+            (u"mod_download_stall", self.__mod_download_monitor.is_stalled),
+            (u"lua_engine_dead", self.__is_server_lua_engine_dead),
+        ]
+
+    def __apply_config(self, cfg):
+        # Every setting is read from the same snapshot in one go, so a reload never leaves a half-applied config.
+        self.__is_config_hot_reload = cfg.config_hot_reload
+        self.__is_adopt_running_server = cfg.adopt_running_server
+        self.__monitor_interval = cfg.monitor_interval
+        self.__is_daily_restart_server = cfg.daily_restart
+        self.__daily_restart_vms_threshold = cfg.daily_restart_vms_threshold
+        if self.__daily_restart_time_hms != cfg.daily_restart_h_m_s:
+            self.__daily_restart_time_hms = cfg.daily_restart_h_m_s
+            self.__next_daily_restart_trigger_time = self.__calc_next_daily_restart_trigger_timestamp()
+
+        self.__is_lua_engine_check_status = cfg.lua_engine_check_status
+        if not self.__is_lua_engine_check_status:
+            # the helper mod's record isn't read anymore, the last heartbeat would only get older
+            self.__heartbeat_time = None
+        self.__lua_engine_no_response_threshold = cfg.lua_engine_no_response_threshold
+        self.__helper_mod_record_pattern = cfg.lua_engine_helper_mod_record_format
+
+        self.__is_perf_restart_server = cfg.perf_restart
+        self.__perf_restart_tick_rate_threshold = cfg.perf_restart_tick_rate_threshold
+        self.__perf_restart_duration = cfg.perf_restart_duration
+        self.__perf_restart_only_when_empty = cfg.perf_restart_only_when_empty
+
+        self.__metrics.apply_config(cfg)
+        self.__mod_download_monitor.apply_config(cfg)
+        self.__crash_loop_guard.apply_config(cfg)
+        self.__cpu_placement.apply_config(cfg)
+        self.__open_status_page(cfg.status_page_path if cfg.status_page else None)
+        WatchdogMetrics.apply_config(cfg)
+        Logger.init_logger()
+
+    def __open_status_page(self, path):
+        if self.__status_page is not None:
+            if self.__status_page.get_path() == path:
+                return
+            self.__status_page.close()
+            self.__status_page = None
+        if path is None:
+            return
+        try:
+            self.__status_page = StatusPageWriter(path)
+        except (IOError, OSError, ValueError) as ex:
+            Logger.warn(u"Fail to open the status page '%s' (%s)" % (path, ex))
+
+    def __reload_config(self):
+        result = ConfigManager.reload_config_if_changed()
+        if result is None:
+            return
+        cfg, changed_keys = result
+        if not changed_keys:
+            Logger.info(u"Config reloaded, nothing changed.")
+            return
+        Logger.info(u"Config reloaded, changed: %s" % u", ".join(changed_keys))
+        self.__apply_config(cfg)
+        if ConfigManager.RESTART_REQUIRED_KEYS.intersection(changed_keys):
+            self.__server.defer_launch_config(cfg)
 
     def run_server(self):
         Logger.info(u"NS2 Server Watchdog script.")
         Logger.info(u"Press Ctrl-C to terminate this script and the running server process.")
         ASyncZipper.start_worker_thread()
 
-        sleep_sec = self.__monitor_interval
-        self.__server.start_server()
+        if self.__is_adopt_running_server and self.__server.adopt_server():
+            self.__on_server_started()
+        else:
+            self.start_server()
         while not ExitFlag:
-            if self.__is_server_process_missing() or \
-                    self.__is_need_daily_restart() or \
-                    self.__is_server_lua_engine_dead():
-                self.__server.restart_server()
+            WatchdogProfiler.poll()
+            self.monitor_once()
             try:
-                time.sleep(sleep_sec)
+                self.__clock.sleep(self.__monitor_interval)
             except IOError:
                 Logger.debug(u"Main loop met IOError during sleep.")
-        self.__server.stop_server()
+        if DetachFlag and self.__server.is_running():
+            Logger.info(u"Leaving the server running, the next watchdog will adopt it.")
+        else:
+            self.__server.stop_server(u"watchdog_exit")
+        self.__server.finish_archive_coalescing()
+        self.__publish_status(None)
+        self.__open_status_page(None)
 
         Logger.info(u"Waiting ZIP thread finish all the work...")
         ASyncZipper.stop_worker_thread()
         ASyncZipper.join()
+        WatchdogMetrics.stop_exporter()
+        WatchdogProfiler.stop()
+
+    def get_monitor_interval(self):
+        return self.__monitor_interval
+
+    def get_metrics_collector(self):
+        return self.__metrics
+
+    def start_server(self):
+        self.__server.start_server()
+        self.__on_server_started()
+
+    def monitor_once(self):
+        """Run one iteration of the monitor loop, return the reason if the server got restarted, otherwise None."""
+        if self.__is_self_timed:
+            loop_start_time = time.time()
+            loop_start_cpu_time = ServerWatchDog.__get_cpu_time()
+        if self.__is_config_hot_reload:
+            self.__reload_config()
+        self.__cpu_placement.check()
+        restart_reason = None
+        if self.__crash_loop_guard.is_holding():
+            # the server is kept down by the crash loop guard, nothing to check
+            if self.__crash_loop_guard.is_hold_over():
+                self.__skip_overdue_daily_restart()
+                self.start_server()
+        else:
+            self.__metrics.poll()
+            self.__server.track_opened_files()
+            restart_reason = self.__check_restart_reason()
+            if restart_reason is not None:
+                self.__restart_server(restart_reason)
+        if not self.__crash_loop_guard.is_in_crash_loop():
+            self.__server.set_archive_coalescing(False)
+        self.__update_metrics()
+        if self.__is_self_timed:
+            WatchdogMetrics.loop_wall_time.observe(time.time() - loop_start_time)
+            WatchdogMetrics.loop_cpu_time.observe(ServerWatchDog.__get_cpu_time() - loop_start_cpu_time)
+        return restart_reason
+
+    def __restart_server(self, reason):
+        WatchdogMetrics.restarts.inc(label_values=(reason,))
+        self.__restart_count = self.__restart_count + 1
+        self.__last_restart_reason = reason
+        self.__last_restart_time = self.__clock.time()
+        self.__crash_loop_guard.record_restart(reason)
+        if self.__crash_loop_guard.is_in_crash_loop():
+            self.__server.set_archive_coalescing(True)
+        if self.__crash_loop_guard.is_holding():
+            self.__server.stop_server(reason)
+        else:
+            self.__server.restart_server(reason)
+            self.__on_server_started()
+
+    @staticmethod
+    def __get_cpu_time():
+        # os.times() is only counted in clock ticks (10ms) on Linux, less than a check usually takes
+        if cmp(platform.system(), 'Windows') is 0:
+            return sum(os.times()[:2])
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime + usage.ru_stime
+
+    def __check_restart_reason(self):
+        if not self.__is_self_timed:
+            for reason, check in self.__restart_checks:
+                if check():
+                    return reason
+            return None
+        for reason, check in self.__restart_checks:
+            start_time = time.time()
+            start_cpu_time = ServerWatchDog.__get_cpu_time()
+            is_need_restart = check()
+            WatchdogMetrics.check_wall_time.observe(time.time() - start_time, (reason,))
+            WatchdogMetrics.check_cpu_time.observe(ServerWatchDog.__get_cpu_time() - start_cpu_time, (reason,))
+            if is_need_restart:
+                return reason
+        return None
+
+    def __update_metrics(self):
+        WatchdogMetrics.loop_iterations.inc()
+        process_info = self.__server.get_info()
+        if process_info is not None:
+            WatchdogMetrics.server_up.set(1)
+            WatchdogMetrics.server_start_time.set(process_info['create_time'])
+            WatchdogMetrics.server_vms.set(process_info['vms'])
+            WatchdogMetrics.server_rss.set(process_info['rss'])
+        else:
+            WatchdogMetrics.server_up.set(0)
+        WatchdogMetrics.heartbeat_age.set(self.__get_heartbeat_age(process_info))
+        for name in ServerMetricsCollector.METRIC_NAMES:
+            value = self.__metrics.get_latest(name)
+            if value is not None:
+                WatchdogMetrics.server_performance.set(value, (name,))
+        WatchdogMetrics.mod_download_throughput.set(self.__mod_download_monitor.get_throughput())
+        self.__publish_status(process_info)
+
+    def __get_heartbeat_age(self, process_info):
+        # NaN while the server is down or kept down, and when the lua engine check doesn't read the helper mod's record
+        if process_info is None or self.__heartbeat_time is None:
+            return float('nan')
+        return self.__clock.time() - self.__heartbeat_time
+
+    def __publish_status(self, process_info):
+        if self.__status_page is None:
+            return
+        now = self.__clock.time()
+        heartbeat_age = self.__get_heartbeat_age(process_info)
+        if process_info is None:
+            process_info = {'pid': -1, 'create_time': 0.0, 'vms': 0, 'rss': 0}
+        self.__status_page.publish(Status(
+            watchdog_pid=os.getpid(),
+            server_pid=process_info['pid'],
+            watchdog_start_time=self.__start_time,
+            update_time=now,
+            server_start_time=process_info['create_time'],
+            heartbeat_age=heartbeat_age,
+            last_restart_time=self.__last_restart_time,
+            restart_count=self.__restart_count,
+            archive_queue_depth=int(WatchdogMetrics.archive_queue_depth.get()),
+            server_vms=process_info['vms'],
+            server_rss=process_info['rss'],
+            crash_loop_state=CRASH_LOOP_STATES.index(self.__crash_loop_guard.get_state()),
+            last_restart_reason=self.__last_restart_reason,
+        ))
+
+    def __on_server_started(self):
+        self.__cpu_placement.on_server_started()
+        self.__heartbeat_time = None
+        self.__is_player_count_unknown_warned = False
+        self.__metrics.reset()
+        self.__mod_download_monitor.begin_startup()
 
     def __is_server_process_missing(self):
         PREFIX_STRING = u"Process monitor: "
@@ -580,12 +2140,48 @@ class ServerWatchDog:
             Logger.warn(PREFIX_STRING + u"unexpected server shutdown detected, restoring...")
             return True
 
+    def __is_need_perf_restart(self):
+        if not self.__is_perf_restart_server:
+            return False
+
+        PREFIX_STRING = u"Performance restart: "
+        threshold = self.__perf_restart_tick_rate_threshold
+        low_duration = self.__metrics.get_series('tick_rate').trailing_duration(lambda v: v < threshold,
+                                                                                self.__perf_restart_duration)
+        if low_duration is None or low_duration < self.__perf_restart_duration:
+            return False
+
+        if self.__perf_restart_only_when_empty:
+            players = self.__metrics.get_latest('players')
+            if players is None:
+                if not self.__is_player_count_unknown_warned:
+                    self.__is_player_count_unknown_warned = True
+                    Logger.warn(PREFIX_STRING + u"tick rate stays below %s for %ds, but the player count is unknown, "
+                                                u"perf_restart_only_when_empty needs the helper mod to report it (or a "
+                                                u"'players' pattern in perf_metrics_log_patterns)" % (
+                                                    threshold, low_duration))
+                return False
+            if players > 0:
+                Logger.debug(PREFIX_STRING + u"tick rate stays below %s for %ds, but the server is not empty" % (
+                    threshold, low_duration))
+                return False
+
+        Logger.info(PREFIX_STRING + u"server will get restarted (tick rate < threshold/%s for %ds)" % (
+            threshold, low_duration))
+        return True
+
+    def __skip_overdue_daily_restart(self):
+        # The daily restart that came due while the server was kept down would restart it right after its start.
+        if self.__clock.time() >= self.__next_daily_restart_trigger_time:
+            Logger.info(u"Daily restart: skipped, it came due while the server was kept down")
+            self.__next_daily_restart_trigger_time = self.__calc_next_daily_restart_trigger_timestamp()
+
     def __is_need_daily_restart(self):
         if not self.__is_daily_restart_server:
             return False
 
         PREFIX_STRING = u"Daily restart: "
-        if time.time() >= self.__next_daily_restart_trigger_time:
+        if self.__clock.time() >= self.__next_daily_restart_trigger_time:
             Logger.info(PREFIX_STRING + u"now is the time to restart")
             self.__next_daily_restart_trigger_time = self.__calc_next_daily_restart_trigger_timestamp()
             process_info = self.__server.get_info()
@@ -614,14 +2210,13 @@ class ServerWatchDog:
         exception_msg = ""
         PREFIX_STRING = u"Lua engine check: "
         try:
-            with open(self.__abspath_helper_mod_output, 'r') as f:
-                st = f.readline()
+            st = self.__server.read_helper_mod_record()
             last_update_time = datetime.datetime.strptime(st, self.__helper_mod_record_pattern)
             last_update_timestamp = time.mktime(last_update_time.timetuple())
         except IOError:
             exception_flag = True
             exception_msg = u"Fail to open helper mod's output: '%s'." % (
-                self.__abspath_helper_mod_output)
+                self.__server.get_helper_mod_record_path())
         except ValueError:
             exception_flag = True
             exception_msg = u"Fail to parse the helper mod's record '%s' with pattern %s." % (
@@ -632,7 +2227,8 @@ class ServerWatchDog:
         else:
             # successfully parsed the helper mod's record
             self.__helper_mod_output_invalid_cnt = 0
-            engine_frozen_time = int(time.time() - last_update_timestamp)
+            self.__heartbeat_time = last_update_timestamp
+            engine_frozen_time = int(self.__clock.time() - last_update_timestamp)
             if engine_frozen_time > self.__lua_engine_no_response_threshold:
                 Logger.info(
                     PREFIX_STRING +
@@ -665,7 +2261,7 @@ class ServerWatchDog:
         return is_dead
 
     def __calc_next_daily_restart_trigger_timestamp(self):
-        time_now_timestamp = time.time()
+        time_now_timestamp = self.__clock.time()
         time_now = time.localtime(time_now_timestamp)
         delta_one_day = datetime.timedelta(days=1)
 
@@ -690,13 +2286,25 @@ def main(argv):
 
 
 def signal_handler(sig, frame):
-    global ExitFlag
+    global ExitFlag, DetachFlag
     if sig == signal.SIGINT:
         Logger.info(u"Captured signal SIGINT, prepare to exit")
         ExitFlag = True
+    elif hasattr(signal, 'SIGUSR2') and sig == signal.SIGUSR2:
+        Logger.info(u"Captured signal SIGUSR2, prepare to exit without stopping the server")
+        DetachFlag = True
+        ExitFlag = True
+    elif hasattr(signal, 'SIGUSR1') and sig == signal.SIGUSR1:
+        WatchdogProfiler.request_toggle()
 
 
 if __name__ == '__main__':
     signal.signal(signal.SIGINT, signal_handler)
+    if hasattr(signal, 'SIGUSR1'):
+        # Send SIGUSR1 to start profiling the watchdog, send it again to stop and dump the stats to ./log
+        signal.signal(signal.SIGUSR1, signal_handler)
+    if hasattr(signal, 'SIGUSR2'):
+        # Send SIGUSR2 to exit without stopping the server, e.g. to upgrade the watchdog
+        signal.signal(signal.SIGUSR2, signal_handler)
     Logger.init_logger()
     main(sys.argv)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python2.7
+#  -*- encoding:UTF-8 -*-
+#
+# Show the live status the watchdogs publish into their status page (status_page_path), without touching their logs.
+# Reading an instance costs a single page read, so a whole fleet can be polled.
+#
+#   python2.7 NS2_Watchdog_Status.py                                 ./watchdog_status.bin
+#   python2.7 NS2_Watchdog_Status.py /srv/ns2/*/watchdog_status.bin  several instances
+#   python2.7 NS2_Watchdog_Status.py --watch 2 /srv/ns2/*             refresh every 2s, a dir stands for its status page
+#   python2.7 NS2_Watchdog_Status.py --json /srv/ns2/*
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+from Utils.StatusPage import CRASH_LOOP_STATES, StatusPageReader
+
+DEFAULT_FILE_NAME = u"watchdog_status.bin"
+MB = 1024 * 1024
+
+
+def format_duration(seconds):
+    if seconds is None or math.isnan(seconds):
+        return u"-"
+    seconds = int(max(seconds, 0))
+    if seconds < 3600:
+        return u"%dm%02ds" % (seconds // 60, seconds % 60)
+    if seconds < 86400:
+        return u"%dh%02dm" % (seconds // 3600, seconds % 3600 // 60)
+    return u"%dd%02dh" % (seconds // 86400, seconds % 86400 // 3600)
+
+
+def to_dict(status, now):
+    d = status._asdict()
+    d['crash_loop_state'] = CRASH_LOOP_STATES[status.crash_loop_state]
+    d['server_uptime'] = now - status.server_start_time if status.server_pid >= 0 else None
+    d['status_age'] = now - status.update_time
+    d['last_restart_age'] = now - status.last_restart_time if status.last_restart_time > 0 else None
+    if math.isnan(status.heartbeat_age):
+        d['heartbeat_age'] = None
+    return d
+
+
+def output(line):
+    print(line.encode('utf-8'))
+
+
+def print_table(rows, stale_threshold):
+    output(u"%-40s %7s %7s %9s %9s %9s %8s %8s %-20s %9s %7s %-9s" % (
+        u"status page", u"wdt", u"server", u"uptime", u"heartbeat", u"updated", u"rss(MB)", u"restarts",
+        u"last restart reason", u"ago", u"archive", u"loop"))
+    for path, d, error in rows:
+        if error is not None:
+            output(u"%-40s %s" % (path, error))
+            continue
+        updated = format_duration(d['status_age'])
+        if d['status_age'] > stale_threshold:
+            updated = u"STALE " + updated
+        output(u"%-40s %7d %7s %9s %9s %9s %8.1f %8d %-20s %9s %7d %-9s" % (
+            path, d['watchdog_pid'], d['server_pid'] if d['server_pid'] >= 0 else u"-",
+            format_duration(d['server_uptime']), format_duration(d['heartbeat_age']), updated,
+            d['server_rss'] / float(MB), d['restart_count'], d['last_restart_reason'] or u"-",
+            format_duration(d['last_restart_age']), d['archive_queue_depth'], d['crash_loop_state']))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Show the live status of NS2 server watchdogs.")
+    parser.add_argument('paths', nargs='*', default=[u"."],
+                        help="status pages, or dirs holding a '%s' (default: .)" % DEFAULT_FILE_NAME)
+    parser.add_argument('--json', action='store_true', help="print the status as JSON lines")
+    parser.add_argument('--watch', type=float, metavar='SEC', help="refresh every SEC seconds until Ctrl-C")
+    parser.add_argument('--stale', type=float, default=10, metavar='SEC',
+                        help="flag the status pages not updated for SEC seconds (default: 10)")
+    args = parser.parse_args(argv[1:])
+
+    paths = []
+    for path in args.paths:
+        path = path if isinstance(path, unicode) else path.decode('utf-8')
+        paths.append(os.path.join(path, DEFAULT_FILE_NAME) if os.path.isdir(path) else path)
+
+    # The pages stay mapped between the refreshes, a page that can't be opened yet is retried at the next one.
+    readers = {}
+    try:
+        while True:
+            rows = []
+            for path in paths:
+                try:
+                    if path not in readers:
+                        readers[path] = StatusPageReader(path)
+                    status = readers[path].read()
+                except (IOError, OSError, ValueError, RuntimeError) as ex:
+                    rows.append((path, None, u"unreadable (%s)" % ex))
+                else:
+                    if status is None:
+                        rows.append((path, None, u"nothing published yet"))
+                        continue
+                    rows.append((path, to_dict(status, time.time()), None))
+
+            if args.json:
+                for path, d, error in rows:
+                    output(json.dumps({'path': path, 'status': d, 'error': error}, sort_keys=True))
+            else:
+                print_table(rows, args.stale)
+            if args.watch is None:
+                return 0 if all(error is None for path, d, error in rows) else 1
+            time.sleep(args.watch)
+            if not args.json:
+                output(u"")
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        for reader in readers.values():
+            reader.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,200 @@
+# encoding: utf-8
+import fnmatch
+import os
+import sqlite3
+import time
+from zipfile import ZipFile
+
+
+class ArchiveIndex:
+    """SQLite index of the archived server runs, so they can be searched without opening any zip.
+
+    Every run is one <name>.zip in the archive dir. The index keeps its files with their sizes, whether it has a crash
+    dump, the reason the run ended, and optionally the full text of its log files.
+    """
+
+    FILE_NAME = u"archive_index.sqlite3"
+    CRASH_DUMP_EXTENSION = u".dmp"
+
+    __SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            archived_at REAL NOT NULL,
+            first_mtime REAL,
+            last_mtime REAL,
+            restart_reason TEXT,
+            file_count INTEGER NOT NULL,
+            total_size INTEGER NOT NULL,
+            compressed_size INTEGER NOT NULL,
+            has_crash_dump INTEGER NOT NULL)""",
+        "CREATE INDEX IF NOT EXISTS runs_archived_at ON runs (archived_at)",
+        """CREATE TABLE IF NOT EXISTS files (
+            run_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            compressed_size INTEGER NOT NULL,
+            mtime REAL)""",
+        "CREATE INDEX IF NOT EXISTS files_run_id ON files (run_id)",
+    ]
+
+    def __init__(self, db_path):
+        self.__db_path = db_path
+        self.__conn = sqlite3.connect(db_path)
+        self.__conn.row_factory = sqlite3.Row
+        with self.__conn:
+            for statement in ArchiveIndex.__SCHEMA:
+                self.__conn.execute(statement)
+            self.__is_fts = self.__create_text_table()
+
+    def __create_text_table(self):
+        # Full-text search needs the FTS4 extension, old SQLite builds fall back to a plain table and LIKE.
+        row = self.__conn.execute("SELECT sql FROM sqlite_master WHERE name = 'log_text'").fetchone()
+        if row is not None:
+            return u"VIRTUAL TABLE" in row[0].upper()
+        try:
+            self.__conn.execute("CREATE VIRTUAL TABLE log_text USING fts4 (run_id, name, content)")
+            return True
+        except sqlite3.OperationalError:
+            self.__conn.execute("CREATE TABLE log_text (run_id INTEGER NOT NULL, name TEXT NOT NULL, content TEXT)")
+            return False
+
+    def get_db_path(self):
+        return self.__db_path
+
+    def close(self):
+        self.__conn.close()
+
+    def add_run(self, name, archived_at, restart_reason, files, texts=()):
+        """Index a run, replacing the previous entry of the same name.
+
+        files is a list of (name, size, compressed size, mtime), texts a list of (file name, unicode content).
+        """
+        mtimes = [f[3] for f in files if f[3] is not None]
+        has_crash_dump = any(f[0].lower().endswith(ArchiveIndex.CRASH_DUMP_EXTENSION) for f in files)
+        with self.__conn:
+            self.__delete_run(name)
+            cursor = self.__conn.execute(
+                "INSERT INTO runs (name, archived_at, first_mtime, last_mtime, restart_reason, file_count, "
+                "total_size, compressed_size, has_crash_dump) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, archived_at, min(mtimes) if mtimes else None, max(mtimes) if mtimes else None,
+                 restart_reason, len(files), sum(f[1] for f in files), sum(f[2] for f in files),
+                 1 if has_crash_dump else 0))
+            run_id = cursor.lastrowid
+            self.__conn.executemany("INSERT INTO files (run_id, name, size, compressed_size, mtime) "
+                                    "VALUES (?, ?, ?, ?, ?)", [(run_id,) + tuple(f) for f in files])
+            self.__conn.executemany("INSERT INTO log_text (run_id, name, content) VALUES (?, ?, ?)",
+                                    [(run_id, n, t) for n, t in texts])
+        return run_id
+
+    def index_zip(self, zip_path, restart_reason=None, full_text_pattern=None, full_text_max_size=0):
+        """Index an existing archive from its central directory, the files are only read for the full text."""
+        files = []
+        texts = []
+        with ZipFile(zip_path, 'r') as z:
+            for info in z.infolist():
+                if info.filename.endswith('/'):
+                    continue
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                files.append((info.filename, info.file_size, info.compress_size, mtime))
+                if ArchiveIndex.is_full_text_candidate(info.filename, info.file_size, full_text_pattern,
+                                                       full_text_max_size):
+                    texts.append((info.filename, z.read(info).decode('utf-8', 'replace')))
+        name = os.path.splitext(os.path.basename(zip_path))[0]
+        return self.add_run(name, os.path.getmtime(zip_path), restart_reason, files, texts)
+
+    @staticmethod
+    def is_full_text_candidate(file_name, size, pattern, max_size):
+        if not pattern or size > max_size:
+            return False
+        return fnmatch.fnmatch(os.path.basename(file_name), pattern)
+
+    def clear(self):
+        with self.__conn:
+            self.__conn.execute("DELETE FROM runs")
+            self.__conn.execute("DELETE FROM files")
+            self.__conn.execute("DELETE FROM log_text")
+
+    def __delete_run(self, name):
+        row = self.__conn.execute("SELECT id FROM runs WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return
+        self.__conn.execute("DELETE FROM files WHERE run_id = ?", (row[0],))
+        self.__conn.execute("DELETE FROM log_text WHERE run_id = ?", (row[0],))
+        self.__conn.execute("DELETE FROM runs WHERE id = ?", (row[0],))
+
+    def get_restart_reasons(self):
+        # run name -> restart reason, the reason can't be recovered from the zip once the index is gone
+        return dict((r['name'], r['restart_reason']) for r in self.__conn.execute(
+            "SELECT name, restart_reason FROM runs WHERE restart_reason IS NOT NULL"))
+
+    def find_runs(self, restart_reason=None, has_crash_dump=None, file_pattern=None, since=None, until=None,
+                  limit=None, is_latest_first=False):
+        sql = "SELECT * FROM runs"
+        conditions = []
+        params = []
+        if restart_reason is not None:
+            conditions.append("restart_reason LIKE ?")
+            params.append(u"%" + restart_reason + u"%")
+        if has_crash_dump is not None:
+            conditions.append("has_crash_dump = ?")
+            params.append(1 if has_crash_dump else 0)
+        if file_pattern is not None:
+            conditions.append("id IN (SELECT run_id FROM files WHERE name GLOB ?)")
+            params.append(file_pattern)
+        if since is not None:
+            conditions.append("archived_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("archived_at < ?")
+            params.append(until)
+        if conditions:
+            sql = sql + " WHERE " + " AND ".join(conditions)
+        sql = sql + (" ORDER BY archived_at DESC" if is_latest_first else " ORDER BY archived_at")
+        if limit is not None:
+            sql = sql + " LIMIT %d" % limit
+        return self.__conn.execute(sql, params).fetchall()
+
+    def get_run(self, run_name):
+        return self.__conn.execute("SELECT * FROM runs WHERE name = ?", (run_name,)).fetchone()
+
+    def get_files(self, run_name):
+        return self.__conn.execute(
+            "SELECT files.* FROM files JOIN runs ON files.run_id = runs.id WHERE runs.name = ? ORDER BY files.name",
+            (run_name,)).fetchall()
+
+    def search_text(self, query, limit=None):
+        """Return the (run name, archived_at, restart reason, file name, snippet) of the log files matching query.
+
+        With FTS4 the query uses the MATCH syntax (words, "a phrase", prefix*), otherwise it's a plain substring.
+        """
+        if self.__is_fts:
+            sql = ("SELECT runs.name, runs.archived_at, runs.restart_reason, log_text.name, "
+                   "snippet(log_text, '[', ']', '...', 2, 16) FROM log_text "
+                   "JOIN runs ON runs.id = log_text.run_id WHERE log_text.content MATCH ? ORDER BY runs.archived_at")
+            params = [query]
+        else:
+            sql = ("SELECT runs.name, runs.archived_at, runs.restart_reason, log_text.name, log_text.content "
+                   "FROM log_text JOIN runs ON runs.id = log_text.run_id WHERE log_text.content LIKE ? "
+                   "ORDER BY runs.archived_at")
+            params = [u"%" + query + u"%"]
+        if limit is not None:
+            sql = sql + " LIMIT %d" % limit
+        results = []
+        for row in self.__conn.execute(sql, params):
+            snippet = row[4]
+            if not self.__is_fts:
+                i = snippet.lower().find(query.lower())
+                snippet = u"..." + snippet[max(i - 60, 0):i + len(query) + 60] + u"..."
+            results.append((row[0], row[1], row[2], row[3], snippet.replace(u"\n", u" ")))
+        return results
+
+    def get_summary(self):
+        summary = dict(self.__conn.execute(
+            "SELECT COUNT(*) AS runs, SUM(has_crash_dump) AS runs_with_crash_dump, SUM(total_size) AS total_size, "
+            "SUM(compressed_size) AS compressed_size, MIN(archived_at) AS first_archived_at, "
+            "MAX(archived_at) AS last_archived_at FROM runs").fetchone())
+        summary['restart_reasons'] = [tuple(r) for r in self.__conn.execute(
+            "SELECT restart_reason, COUNT(*) FROM runs GROUP BY restart_reason ORDER BY COUNT(*) DESC")]
+        summary['is_full_text_search'] = self.__is_fts
+        return summary
@@ -0,0 +1,25 @@
+# encoding: utf-8
+import time
+
+
+class SystemClock:
+    """The wall clock, what the watchdog uses when it's watching a real server."""
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """A clock that only moves when someone sleeps on it, so a simulation can replay days of decisions at once."""
+
+    def __init__(self, start_time):
+        self.__now = float(start_time)
+
+    def time(self):
+        return self.__now
+
+    def sleep(self, seconds):
+        self.__now = self.__now + seconds
@@ -0,0 +1,99 @@
+# encoding: utf-8
+import os
+import stat
+
+
+class DirSizeTracker:
+    """Keep the total size of a directory tree up to date without walking the whole tree on every poll.
+
+    Only the directories whose mtime changed are listed again (that's where files got created, renamed or deleted).
+    The files which changed recently are stat-ed on every poll, the others are re-checked a slice at a time, so a
+    poll costs one stat per directory plus a bounded number of file stats.
+    """
+
+    # A file which didn't change for this many polls is moved to the cold set.
+    __HOT_POLLS = 5
+    # How many polls it takes to re-check every cold file once.
+    __COLD_SLICES = 16
+
+    def __init__(self, root):
+        self.__root = root
+        self.__dirs = {}  # dir path -> mtime
+        self.__files = {}  # file path -> [size, polls since the last change]
+        self.__total = 0
+        self.__poll_count = 0
+
+    def get_total(self):
+        return self.__total
+
+    def rescan(self):
+        self.__dirs = {}
+        self.__files = {}
+        self.__total = 0
+        self.__poll_count = 0
+        self.__scan_dir(self.__root)
+        return self.__total
+
+    def poll(self):
+        self.__poll_count = self.__poll_count + 1
+
+        for dir_path, mtime in self.__dirs.items():
+            try:
+                st = os.stat(dir_path)
+            except OSError:
+                self.__forget_dir(dir_path)
+                continue
+            if st.st_mtime != mtime:
+                self.__scan_dir(dir_path)
+
+        cold_slice = self.__poll_count % DirSizeTracker.__COLD_SLICES
+        for file_path, state in self.__files.items():
+            if state[1] >= DirSizeTracker.__HOT_POLLS and hash(file_path) % DirSizeTracker.__COLD_SLICES != cold_slice:
+                continue
+            self.__update_file(file_path, state)
+        return self.__total
+
+    def __update_file(self, file_path, state):
+        try:
+            size = os.stat(file_path).st_size
+        except OSError:
+            self.__total = self.__total - state[0]
+            del self.__files[file_path]
+            return
+        if size != state[0]:
+            self.__total = self.__total + size - state[0]
+            state[0] = size
+            state[1] = 0
+        else:
+            state[1] = state[1] + 1
+
+    def __scan_dir(self, dir_path):
+        try:
+            self.__dirs[dir_path] = os.stat(dir_path).st_mtime
+            names = os.listdir(dir_path)
+        except OSError:
+            self.__forget_dir(dir_path)
+            return
+
+        for name in names:
+            path = os.path.join(dir_path, name)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                if path not in self.__dirs:
+                    self.__scan_dir(path)
+            elif stat.S_ISREG(st.st_mode) and path not in self.__files:
+                self.__files[path] = [st.st_size, 0]
+                self.__total = self.__total + st.st_size
+
+    def __forget_dir(self, dir_path):
+        # Drop a vanished directory and everything that was tracked below it.
+        prefix = dir_path + os.sep
+        self.__dirs.pop(dir_path, None)
+        for path in [p for p in self.__dirs if p.startswith(prefix)]:
+            del self.__dirs[path]
+        for path in [p for p in self.__files if p.startswith(prefix)]:
+            self.__total = self.__total - self.__files[path][0]
+            del self.__files[path]
@@ -0,0 +1,18 @@
+# encoding: utf-8
+import importlib
+
+
+class LazyModule(object):
+    """Stand-in for a module which only gets imported when one of its attributes is used for the first time.
+
+    An "except module.Error" clause only touches the module when an exception actually goes through it.
+    """
+
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+
+    def __getattr__(self, attr):
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name)
+        return getattr(self.__module, attr)
@@ -0,0 +1,73 @@
+# encoding: utf-8
+import fnmatch
+import os
+import stat
+
+
+class LogTailer:
+    """Incrementally read the lines appended to the files of a directory.
+
+    Only the bytes written since the previous poll are read. A file that shrinks or gets replaced (different inode)
+    is read again from the beginning, and an incomplete last line is kept until its line break arrives.
+    """
+
+    __ENCODING = 'utf-8'
+
+    def __init__(self, dir_path, file_pattern=u"*", max_bytes_per_poll=1024 * 1024):
+        self.__dir_path = dir_path
+        self.__file_pattern = file_pattern
+        self.__max_bytes_per_poll = max_bytes_per_poll
+        # file name -> [inode, offset, partial line]
+        self.__states = {}
+
+    def reset(self):
+        self.__states = {}
+
+    def poll(self):
+        """Return the list of (file name, line) pairs completed since the last poll."""
+        try:
+            names = os.listdir(self.__dir_path)
+        except OSError:
+            self.__states = {}
+            return []
+
+        lines = []
+        budget = self.__max_bytes_per_poll
+        alive = set()
+        for name in sorted(names):
+            if not fnmatch.fnmatch(name, self.__file_pattern):
+                continue
+            path = os.path.join(self.__dir_path, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            alive.add(name)
+
+            state = self.__states.get(name)
+            if state is None or state[0] != st.st_ino or st.st_size < state[1]:
+                state = [st.st_ino, 0, b""]
+                self.__states[name] = state
+            if st.st_size == state[1] or budget <= 0:
+                continue
+
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(state[1])
+                    data = f.read(min(st.st_size - state[1], budget))
+            except IOError:
+                continue
+            state[1] = state[1] + len(data)
+            budget = budget - len(data)
+
+            chunks = (state[2] + data).split(b"\n")
+            state[2] = chunks.pop()
+            for chunk in chunks:
+                lines.append((name, chunk.rstrip(b"\r").decode(LogTailer.__ENCODING, 'replace')))
+
+        for name in self.__states.keys():
+            if name not in alive:
+                del self.__states[name]
+        return lines
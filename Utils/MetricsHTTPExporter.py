@@ -0,0 +1,57 @@
+# encoding: utf-8
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from threading import Thread
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MetricsHTTPExporter:
+    """Serve a Registry in the Prometheus text format at /metrics from a background thread."""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, registry):
+        self.__registry = registry
+        self.__httpd = None
+        self.__thread = None
+
+    def is_running(self):
+        return self.__httpd is not None
+
+    def start(self, address, port):
+        registry = self.__registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', MetricsHTTPExporter.CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                # keep the scrapes out of the console
+                pass
+
+        # raises socket.error if the address can't be bound
+        self.__httpd = _ThreadingHTTPServer((address, port), Handler)
+        self.__thread = Thread(target=self.__httpd.serve_forever)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        if self.__httpd is None:
+            return
+        self.__httpd.shutdown()
+        self.__httpd.server_close()
+        self.__thread.join()
+        self.__httpd = None
+        self.__thread = None
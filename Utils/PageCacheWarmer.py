@@ -0,0 +1,102 @@
+# encoding: utf-8
+import io
+import os
+import time
+from Queue import Empty, Queue
+from threading import Lock, Thread
+
+
+class PageCacheWarmer:
+    """Read files with a few parallel readers and throw the data away, so they're in the OS file cache when needed.
+
+    Unlike an advisory hint (posix_fadvise, readahead), plain reads work on every OS and the files are known to be
+    cached once they are done. The files are listed by list_paths and read in that order, up to byte_budget bytes in
+    total. Listing them may walk a big mod tree, so it's done in the warmer's own thread as well.
+    """
+
+    __CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, list_paths, byte_budget, readers):
+        self.__list_paths = list_paths
+        self.__byte_budget = byte_budget
+        self.__readers = readers
+        self.__jobs = Queue()
+        self.__planned_files = 0
+        self.__planned_bytes = 0
+
+        self.__lock = Lock()
+        self.__read_bytes = 0
+        self.__is_cancelled = False
+        self.__start_time = None
+        self.__finish_time = None
+        self.__thread = Thread(target=self.__warm)
+        self.__thread.daemon = True
+
+    def start(self):
+        self.__start_time = time.time()
+        self.__thread.start()
+
+    def wait(self, timeout):
+        """Wait until every file is read, return False if it's still going after timeout seconds."""
+        self.__thread.join(timeout)
+        return not self.__thread.is_alive()
+
+    def cancel(self):
+        # The readers stop at their next chunk.
+        self.__is_cancelled = True
+
+    def get_stats(self):
+        """Return (planned files, planned bytes, bytes read, seconds spent so far)."""
+        if self.__start_time is None:
+            return 0, 0, 0, 0.0
+        end_time = time.time() if self.__finish_time is None else self.__finish_time
+        with self.__lock:
+            return self.__planned_files, self.__planned_bytes, self.__read_bytes, end_time - self.__start_time
+
+    def __warm(self):
+        try:
+            self.__plan(self.__list_paths())
+            reader_count = min(self.__readers, self.__planned_files)
+            readers = [Thread(target=self.__read_queued_files) for _ in range(reader_count)]
+            for t in readers:
+                t.daemon = True
+                t.start()
+            for t in readers:
+                t.join()
+        finally:
+            self.__finish_time = time.time()
+
+    def __plan(self, paths):
+        for path in paths:
+            if self.__is_cancelled or self.__planned_bytes >= self.__byte_budget:
+                break
+            try:
+                size = min(os.path.getsize(path), self.__byte_budget - self.__planned_bytes)
+            except OSError:
+                continue
+            self.__jobs.put((path, size))
+            with self.__lock:
+                self.__planned_files = self.__planned_files + 1
+                self.__planned_bytes = self.__planned_bytes + size
+
+    def __read_queued_files(self):
+        buf = bytearray(PageCacheWarmer.__CHUNK_SIZE)
+        while not self.__is_cancelled:
+            try:
+                path, size = self.__jobs.get_nowait()
+            except Empty:
+                return
+            try:
+                # unbuffered, so the data goes straight from the OS into buf
+                with io.open(path, 'rb', buffering=0) as f:
+                    remaining = size
+                    while remaining > 0 and not self.__is_cancelled:
+                        n = f.readinto(buf)
+                        if not n:
+                            break
+                        remaining = remaining - n
+                        with self.__lock:
+                            self.__read_bytes = self.__read_bytes + n
+            except (IOError, OSError):
+                # the file went away or can't be read, the server will deal with it
+                continue
@@ -0,0 +1,154 @@
+# encoding: utf-8
+from bisect import bisect_left
+from threading import Lock
+
+
+class Metric(object):
+    """A metric family in the Prometheus text format, updated in place.
+
+    Values are plain floats stored in a dict keyed by the tuple of label values. The updates take a lock, a metric
+    may be increased by one thread and decreased by another (the archive queue depth). Rendering only reads the
+    dict and doesn't take it.
+    """
+
+    def __init__(self, name, help_text, metric_type, label_names=()):
+        self.__name = name
+        self.__label_names = tuple(label_names)
+        self.__header = u"# HELP %s %s\n# TYPE %s %s\n" % (name, help_text, name, metric_type)
+        self.__values = {}
+        self.__line_prefixes = {}
+        self.__lock = Lock()
+        if not self.__label_names:
+            self.__values[()] = 0.0
+
+    def get_name(self):
+        return self.__name
+
+    def get(self, label_values=()):
+        return self.__values.get(label_values, 0.0)
+
+    def get_all(self):
+        # label values -> value
+        return dict(self.__values)
+
+    def set(self, value, label_values=()):
+        with self.__lock:
+            if label_values not in self.__values:
+                self.__add_label_values(label_values)
+            self.__values[label_values] = float(value)
+
+    def inc(self, amount=1.0, label_values=()):
+        with self.__lock:
+            if label_values not in self.__values:
+                self.__add_label_values(label_values)
+            self.__values[label_values] = self.__values[label_values] + amount
+
+    def dec(self, amount=1.0, label_values=()):
+        self.inc(-amount, label_values)
+
+    def __add_label_values(self, label_values):
+        assert len(label_values) == len(self.__label_names)
+        # The line prefix is computed once per label set, rendering only has to append the value.
+        labels = u",".join(u"%s=\"%s\"" % (n, Metric.escape_label_value(v))
+                           for n, v in zip(self.__label_names, label_values))
+        self.__line_prefixes[label_values] = u"%s{%s} " % (self.__name, labels)
+        self.__values[label_values] = 0.0
+
+    @staticmethod
+    def escape_label_value(value):
+        return unicode(value).replace(u"\\", u"\\\\").replace(u"\"", u"\\\"").replace(u"\n", u"\\n")
+
+    @staticmethod
+    def format_value(value):
+        if value != value:
+            return u"NaN"
+        if value in (float('inf'), float('-inf')):
+            return u"+Inf" if value > 0 else u"-Inf"
+        return repr(value)
+
+    def render(self, out):
+        out.append(self.__header)
+        for label_values, value in sorted(self.__values.items()):
+            prefix = self.__line_prefixes.get(label_values, self.__name + u" ")
+            out.append(u"%s%s\n" % (prefix, Metric.format_value(value)))
+
+
+class Counter(Metric):
+    def __init__(self, name, help_text, label_names=()):
+        Metric.__init__(self, name, help_text, u"counter", label_names)
+
+
+class Gauge(Metric):
+    def __init__(self, name, help_text, label_names=()):
+        Metric.__init__(self, name, help_text, u"gauge", label_names)
+
+
+class Histogram(object):
+    """A histogram with fixed buckets, observing a value only increments one bucket counter in place."""
+
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.__name = name
+        self.__buckets = tuple(sorted(buckets))
+        self.__label_names = tuple(label_names)
+        self.__header = u"# HELP %s %s\n# TYPE %s histogram\n" % (name, help_text, name)
+        # label values -> [per-bucket counts (the last one is +Inf), sum, count]
+        self.__states = {}
+        self.__line_prefixes = {}
+        if not self.__label_names:
+            self.__add_label_values(())
+
+    def get_name(self):
+        return self.__name
+
+    def get_count(self, label_values=()):
+        state = self.__states.get(label_values)
+        return 0 if state is None else state[2]
+
+    def observe(self, value, label_values=()):
+        state = self.__states.get(label_values)
+        if state is None:
+            state = self.__add_label_values(label_values)
+        state[0][bisect_left(self.__buckets, value)] += 1
+        state[1] = state[1] + value
+        state[2] = state[2] + 1
+
+    def __add_label_values(self, label_values):
+        assert len(label_values) == len(self.__label_names)
+        labels = [u"%s=\"%s\"" % (n, Metric.escape_label_value(v)) for n, v in zip(self.__label_names, label_values)]
+        bucket_prefixes = []
+        for le in self.__buckets + (float('inf'),):
+            bucket_labels = u",".join(labels + [u"le=\"%s\"" % Metric.format_value(float(le))])
+            bucket_prefixes.append(u"%s_bucket{%s} " % (self.__name, bucket_labels))
+        label_str = u"{%s}" % u",".join(labels) if labels else u""
+        self.__line_prefixes[label_values] = (bucket_prefixes,
+                                              u"%s_sum%s " % (self.__name, label_str),
+                                              u"%s_count%s " % (self.__name, label_str))
+        state = [[0] * (len(self.__buckets) + 1), 0.0, 0]
+        self.__states[label_values] = state
+        return state
+
+    def render(self, out):
+        out.append(self.__header)
+        for label_values, state in sorted(self.__states.items()):
+            bucket_prefixes, sum_prefix, count_prefix = self.__line_prefixes[label_values]
+            cumulative = 0
+            for prefix, count in zip(bucket_prefixes, state[0]):
+                cumulative = cumulative + count
+                out.append(u"%s%d\n" % (prefix, cumulative))
+            out.append(u"%s%s\n" % (sum_prefix, Metric.format_value(state[1])))
+            out.append(u"%s%d\n" % (count_prefix, state[2]))
+
+
+class Registry(object):
+    def __init__(self):
+        self.__metrics = []
+
+    def register(self, metric):
+        self.__metrics.append(metric)
+        return metric
+
+    def render(self):
+        out = []
+        for m in self.__metrics:
+            m.render(out)
+        return u"".join(out)
@@ -0,0 +1,113 @@
+# encoding: utf-8
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+
+# The status page is a fixed-layout little-endian record at the beginning of a memory-mapped file:
+#
+#   header: magic, layout version, record size, sequence
+#   body:   the Status fields below
+#
+# The writer makes the sequence odd before touching the body and even again once it's done (a seqlock). A reader
+# copies the body between two reads of the sequence and retries if they differ or are odd, so it never returns a
+# torn record and never blocks the writer.
+
+MAGIC = b"NS2W"
+LAYOUT_VERSION = 1
+
+CRASH_LOOP_STATES = (u"closed", u"backoff", u"open", u"half_open")
+
+Status = namedtuple('Status', [
+    'watchdog_pid',
+    'server_pid',  # -1 if the server isn't running
+    'watchdog_start_time',
+    'update_time',
+    'server_start_time',  # 0 if the server isn't running
+    'heartbeat_age',  # NaN if unknown
+    'last_restart_time',  # 0 if never restarted
+    'restart_count',
+    'archive_queue_depth',
+    'server_vms',
+    'server_rss',
+    'crash_loop_state',  # index in CRASH_LOOP_STATES
+    'last_restart_reason',
+])
+
+MAX_REASON_SIZE = 64
+
+_HEADER = struct.Struct('<4sHHQ')
+_SEQUENCE = struct.Struct('<Q')
+_SEQUENCE_OFFSET = 8
+_BODY = struct.Struct('<iiddddd II QQ B 7x %ds' % MAX_REASON_SIZE)
+_BODY_OFFSET = _HEADER.size
+RECORD_SIZE = _HEADER.size + _BODY.size
+PAGE_SIZE = max(mmap.PAGESIZE, RECORD_SIZE)
+
+
+class StatusPageWriter:
+    """Publish a Status into a memory-mapped file, updating it in place."""
+
+    def __init__(self, path):
+        self.__path = path
+        mode = 'r+b' if os.path.exists(path) else 'w+b'
+        self.__file = open(path, mode)
+        self.__file.truncate(PAGE_SIZE)
+        self.__map = mmap.mmap(self.__file.fileno(), PAGE_SIZE)
+        self.__sequence = _SEQUENCE.unpack_from(self.__map, _SEQUENCE_OFFSET)[0]
+        if self.__sequence % 2 == 1:
+            # left odd by a writer that died in the middle of an update
+            self.__sequence = self.__sequence + 1
+        _HEADER.pack_into(self.__map, 0, MAGIC, LAYOUT_VERSION, RECORD_SIZE, self.__sequence)
+
+    def get_path(self):
+        return self.__path
+
+    def publish(self, status):
+        reason = status.last_restart_reason.encode('utf-8')[:MAX_REASON_SIZE]
+        _SEQUENCE.pack_into(self.__map, _SEQUENCE_OFFSET, self.__sequence + 1)
+        _BODY.pack_into(self.__map, _BODY_OFFSET, *(status[:-1] + (reason,)))
+        self.__sequence = self.__sequence + 2
+        _SEQUENCE.pack_into(self.__map, _SEQUENCE_OFFSET, self.__sequence)
+
+    def close(self):
+        self.__map.close()
+        self.__file.close()
+
+
+class StatusPageReader:
+    """Read the Status published by a StatusPageWriter, possibly in another process."""
+
+    def __init__(self, path):
+        self.__path = path
+        with open(path, 'rb') as f:
+            self.__map = mmap.mmap(f.fileno(), RECORD_SIZE, access=mmap.ACCESS_READ)
+        magic, version, record_size, sequence = _HEADER.unpack_from(self.__map, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION or record_size != RECORD_SIZE:
+            self.__map.close()
+            raise ValueError("'%s' is not a status page of layout version %d" % (path, LAYOUT_VERSION))
+
+    def get_path(self):
+        return self.__path
+
+    def read(self, max_retries=1000):
+        """Return a consistent Status, None if nothing was published yet.
+
+        Raise RuntimeError if the writer kept updating the page during every attempt.
+        """
+        for i in range(max_retries):
+            sequence = _SEQUENCE.unpack_from(self.__map, _SEQUENCE_OFFSET)[0]
+            if sequence == 0:
+                return None
+            if sequence % 2 == 0:
+                body = self.__map[_BODY_OFFSET:_BODY_OFFSET + _BODY.size]
+                if _SEQUENCE.unpack_from(self.__map, _SEQUENCE_OFFSET)[0] == sequence:
+                    values = _BODY.unpack(body)
+                    return Status(*(values[:-1] + (values[-1].rstrip(b"\0").decode('utf-8', 'replace'),)))
+            # back off, the writer may have been preempted in the middle of an update
+            time.sleep(0.0001 * min(i, 10))
+        raise RuntimeError("'%s' kept changing while being read" % self.__path)
+
+    def close(self):
+        self.__map.close()
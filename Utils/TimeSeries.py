@@ -0,0 +1,75 @@
+# encoding: utf-8
+from array import array
+
+
+class TimeSeries:
+    """Fixed-capacity ring buffer of (timestamp, value) samples.
+
+    Samples are stored in two flat double arrays, so a series with a few thousand samples costs a few dozen KB and
+    appending never allocates once the buffer is full.
+    """
+
+    def __init__(self, capacity):
+        assert capacity > 0
+        self.__capacity = capacity
+        self.__timestamps = array('d', [0.0] * capacity)
+        self.__values = array('d', [0.0] * capacity)
+        self.__head = 0  # index of the next slot to write
+        self.__size = 0
+
+    def __len__(self):
+        return self.__size
+
+    def clear(self):
+        self.__head = 0
+        self.__size = 0
+
+    def append(self, timestamp, value):
+        self.__timestamps[self.__head] = timestamp
+        self.__values[self.__head] = value
+        self.__head = (self.__head + 1) % self.__capacity
+        if self.__size < self.__capacity:
+            self.__size = self.__size + 1
+
+    def latest(self):
+        if self.__size == 0:
+            return None
+        idx = (self.__head - 1) % self.__capacity
+        return self.__timestamps[idx], self.__values[idx]
+
+    def iter_reversed(self):
+        # newest sample first
+        idx = self.__head
+        for _ in xrange(self.__size):
+            idx = (idx - 1) % self.__capacity
+            yield self.__timestamps[idx], self.__values[idx]
+
+    def samples_since(self, timestamp):
+        result = []
+        for ts, v in self.iter_reversed():
+            if ts < timestamp:
+                break
+            result.append((ts, v))
+        result.reverse()
+        return result
+
+    def trailing_duration(self, predicate, limit=None):
+        """Return how long (in seconds) the most recent samples have continuously satisfied the predicate.
+
+        The duration is measured from the oldest sample of the trailing run to the newest sample, so it is 0 if only
+        the newest sample satisfies the predicate, and None if even the newest one does not (or the series is empty).
+        If a limit is given, the scan stops as soon as the duration reaches it.
+        """
+        newest_ts = None
+        run_start_ts = None
+        for ts, v in self.iter_reversed():
+            if not predicate(v):
+                break
+            if newest_ts is None:
+                newest_ts = ts
+            run_start_ts = ts
+            if limit is not None and newest_ts - run_start_ts >= limit:
+                break
+        if newest_ts is None:
+            return None
+        return newest_ts - run_start_ts